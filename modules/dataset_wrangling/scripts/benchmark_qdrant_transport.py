@@ -0,0 +1,254 @@
+"""
+This script compares the REST and gRPC transports of the qdrant client on points shaped like
+ours: 384-d dense vectors with a chunk-sized payload.
+
+For each transport it fills an empty temporary collection with batched upserts, once from the
+sync client and once again, into a fresh collection, with concurrent upserts from the async
+client, so both runs measure inserts. It then measures search latency. The benchmark refuses to
+run on a collection that already exists, and only deletes the collections it created.
+
+Usage:
+    python scripts/benchmark_qdrant_transport.py --num_points 20000 --batch_size 256
+
+Arguments:
+    --num_points (int): Points upserted per run.
+    --batch_size (int): Points per upsert request.
+    --concurrency (int): Upserts in flight at once from the async client.
+    --num_queries (int): Searches run to measure latency.
+    --collection (str): The temporary collection to benchmark on, which must not exist yet.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import uuid
+from argparse import ArgumentParser
+from typing import Dict, List
+
+import numpy as np
+from loguru import logger
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.models import PointStruct
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.vector_db_api import get_async_qdrant_client, get_qdrant_client
+
+# Size of the MiniLM vectors (QDRANT_VECTOR_SIZE in src/news_documents.py), kept here so the
+# benchmark runs without loading the model
+VECTOR_SIZE = 384
+CHUNK_TEXT = "Shares of the company rose after it reported quarterly earnings. " * 8
+
+
+def build_batches(num_points: int, batch_size: int) -> List[List[PointStruct]]:
+    """
+    Build random points, normalized like the MiniLM embeddings, split into upsert batches.
+
+    Args:
+        num_points (int): The number of points.
+        batch_size (int): The number of points per batch.
+
+    Returns:
+        List[List[PointStruct]]: The batches.
+    """
+    vectors = np.random.default_rng(0).standard_normal(
+        (num_points, VECTOR_SIZE), dtype=np.float32
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    points = [
+        PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector.tolist(),
+            payload={
+                "headline": f"Article {i}",
+                "text": CHUNK_TEXT,
+                "symbols": ["AAPL"],
+            },
+        )
+        for i, vector in enumerate(vectors)
+    ]
+    return [points[i : i + batch_size] for i in range(0, num_points, batch_size)]
+
+
+def reset_collection(
+    qdrant_client: QdrantClient, collection: str, created: bool
+) -> None:
+    """
+    Start from an empty collection, so every upsert run measures inserts.
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client.
+        collection (str): The temporary collection.
+        created (bool): Whether this script already created the collection, and may delete it.
+    """
+    if created:
+        qdrant_client.delete_collection(collection_name=collection)
+    qdrant_client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+    )
+
+
+def benchmark_sync_upsert(
+    prefer_grpc: bool, collection: str, batches: List[List[PointStruct]]
+) -> float:
+    """
+    Upsert the batches one after the other from the sync client.
+
+    Returns:
+        float: Points upserted per second.
+    """
+    qdrant_client = get_qdrant_client(prefer_grpc)
+    start = time.perf_counter()
+    for batch in batches:
+        qdrant_client.upsert(collection_name=collection, points=batch)
+    elapsed = time.perf_counter() - start
+    qdrant_client.close()
+
+    return sum(len(batch) for batch in batches) / elapsed
+
+
+async def benchmark_async_upsert(
+    prefer_grpc: bool,
+    collection: str,
+    batches: List[List[PointStruct]],
+    concurrency: int,
+) -> float:
+    """
+    Upsert the batches from the async client with `concurrency` requests in flight.
+
+    Returns:
+        float: Points upserted per second.
+    """
+    qdrant_client = get_async_qdrant_client(prefer_grpc)
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def upsert(batch: List[PointStruct]) -> None:
+        async with in_flight:
+            await qdrant_client.upsert(collection_name=collection, points=batch)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upsert(batch) for batch in batches))
+    elapsed = time.perf_counter() - start
+    await qdrant_client.close()
+
+    return sum(len(batch) for batch in batches) / elapsed
+
+
+def benchmark_search(prefer_grpc: bool, collection: str, num_queries: int) -> Dict:
+    """
+    Run top-10 searches with random query vectors, one at a time.
+
+    Returns:
+        Dict: The p50 and p99 latencies in milliseconds.
+    """
+    queries = np.random.default_rng(1).standard_normal(
+        (num_queries, VECTOR_SIZE), dtype=np.float32
+    )
+    qdrant_client = get_qdrant_client(prefer_grpc)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        qdrant_client.query_points(
+            collection_name=collection, query=query.tolist(), limit=10
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    qdrant_client.close()
+
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main(
+    num_points: int,
+    batch_size: int,
+    concurrency: int,
+    num_queries: int,
+    collection: str,
+) -> None:
+    """
+    Benchmark both transports and log the comparison.
+
+    Args:
+        num_points (int): Points upserted per run.
+        batch_size (int): Points per upsert request.
+        concurrency (int): Upserts in flight at once from the async client.
+        num_queries (int): Searches run to measure latency.
+        collection (str): The temporary collection to benchmark on, which must not exist yet.
+    """
+    qdrant_client = get_qdrant_client()
+    if qdrant_client.collection_exists(collection_name=collection):
+        qdrant_client.close()
+        raise ValueError(
+            f"Collection {collection} already exists, pass another --collection: "
+            "the benchmark deletes the collection it runs on"
+        )
+
+    batches = build_batches(num_points, batch_size)
+    results = {}
+    created = False
+
+    try:
+        for transport, prefer_grpc in [("rest", False), ("grpc", True)]:
+            reset_collection(qdrant_client, collection, created)
+            created = True
+            sync_rate = benchmark_sync_upsert(prefer_grpc, collection, batches)
+            reset_collection(qdrant_client, collection, created)
+            async_rate = asyncio.run(
+                benchmark_async_upsert(prefer_grpc, collection, batches, concurrency)
+            )
+            search = benchmark_search(prefer_grpc, collection, num_queries)
+
+            results[transport] = {
+                "sync_upsert_points_per_s": sync_rate,
+                "async_upsert_points_per_s": async_rate,
+                **search,
+            }
+            logger.info(f"{transport}: {results[transport]}")
+    finally:
+        if created:
+            qdrant_client.delete_collection(collection_name=collection)
+        qdrant_client.close()
+
+    for metric in results["rest"]:
+        rest, grpc = results["rest"][metric], results["grpc"][metric]
+        logger.info(
+            f"{metric:<28} rest {rest:>10.1f} | grpc {grpc:>10.1f} | grpc/rest {grpc / rest:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--num_points", type=int, default=20000, help="Points upserted per run."
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=256, help="Points per upsert request."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Upserts in flight at once from the async client.",
+    )
+    parser.add_argument(
+        "--num_queries", type=int, default=500, help="Searches run to measure latency."
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default="transport_benchmark",
+        help="The temporary collection to benchmark on, which must not exist yet.",
+    )
+    args = parser.parse_args()
+
+    main(
+        args.num_points,
+        args.batch_size,
+        args.concurrency,
+        args.num_queries,
+        args.collection,
+    )
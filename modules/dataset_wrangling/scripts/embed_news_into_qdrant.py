@@ -6,49 +6,92 @@
 # DONE: Authenticate with Qdrant and create a Qdrant Collection - src
 # DONE: Push the cleaned content into Qdrant - src
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 import os
 import sys
 import json
 
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+from datetime import datetime
 import multiprocessing
 
 
 from loguru import logger
+from qdrant_client import QdrantClient
 from tqdm import tqdm
 
-
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from src.paths import RAW_NEWS_PATH
-from src.news_documents import parse_article, chunk_document, embed_document
+from src.paths import RAW_NEWS_PATH, NEWS_STORE_PATH, SPILL_PATH
+from src.news_store import load_news_range
+from src.news_documents import (
+    QDRANT_VECTOR_SIZE,
+    model,
+    parse_article,
+    chunk_document,
+    embed_document,
+    sparse_embed_document,
+    average_chunk_length,
+)
+from src.execution_plan import (
+    ExecutionPlan,
+    apply_plan,
+    model_size_bytes,
+    plan_execution,
+)
+from src.resource_governor import (
+    ResourceGovernor,
+    SpillQueue,
+    default_memory_limit,
+)
 from src.vector_db_api import (
     push_document_to_qdrant,
     get_qdrant_client,
     init_collection,
+    create_keyword_indexes,
+    has_sparse_vectors,
 )
 
 QDRANT_COLLECTION_NAME = "alpaca_news"
-VECTOR_SIZE = 384
 LOGGING_LEVEL = "INFO"
+# Attempts at processing an article before it is skipped
+MAX_ATTEMPTS = 3
 
+# Qdrant client of this process, opened once and reused for all of its articles
+worker_qdrant_client: Optional[QdrantClient] = None
 
-def load_news(from_date: str, to_date: str) -> Dict:
+
+def load_news(from_date: str, to_date: str) -> List[Dict]:
     """
-    Load news data from a JSON file.
+    Load news data for a date range from the news store.
+    Falls back to a legacy JSON file named after the exact range if the store has no articles.
 
     Args:
     - from_date: str: Start date in the format 'YYYY-MM-DD'.
-    - to_date: str: End date in the format 'YYYY-MM-DD'.
+    - to_date: str: End date in the format 'YYYY-MM-DD' (exclusive).
 
     Returns:
-    - Dict: News data.
+    - List[Dict]: News data.
     """
+    data = load_news_range(
+        datetime.fromisoformat(from_date),
+        datetime.fromisoformat(to_date),
+        NEWS_STORE_PATH,
+    )
+    if data:
+        return data
+
     filename = f"news_{from_date}_{to_date}.json"
     if not os.path.isfile(RAW_NEWS_PATH / filename):
-        logger.error(f"News file: {filename} not found!!")
+        logger.error(
+            f"No news found in {NEWS_STORE_PATH} between {from_date} and {to_date}!!"
+        )
         sys.exit(1)
 
+    logger.warning(f"Loading news from legacy file: {filename}")
     with open(RAW_NEWS_PATH / filename, "r", encoding="utf-8") as file:
         data = json.load(file)
 
@@ -57,25 +100,25 @@ def load_news(from_date: str, to_date: str) -> Dict:
 
 def process_and_push_document(
     article: Dict,
+    batch_size: int = 1,
+    sparse_avg_length: Optional[float] = None,
+    collection_name: str = QDRANT_COLLECTION_NAME,
 ) -> None:
     """
-    Process and push a news article into Qdrant.
+    Process and push a news article into Qdrant, through the client of this process. The
+    collection is created by `main` before any article is processed.
 
     Args:
     - article: Dict: A news article.
+    - batch_size: int: Number of chunks embedded per forward pass.
+    - sparse_avg_length: Optional[float]: Average number of words per chunk of the news data, to
+      also push the BM25 sparse vectors of the chunks. None to push the dense vectors only.
+    - collection_name: str: The Qdrant collection to push into.
 
     Returns:
     - None
     """
 
-    # Instantiating qdrant client
-    qdrant_client = get_qdrant_client()
-    qdrant_client = init_collection(
-        qdrant_client,
-        QDRANT_COLLECTION_NAME,
-        VECTOR_SIZE,
-    )
-
     # Parsing the doc
     document = parse_article(article)
 
@@ -83,62 +126,404 @@ def process_and_push_document(
     document = chunk_document(document)
 
     # Embedding the doc
-    document = embed_document(document)
+    document = embed_document(document, batch_size)
+    if sparse_avg_length is not None:
+        document = sparse_embed_document(document, sparse_avg_length)
 
     # Push document to the qdrant collection
-    push_document_to_qdrant(document, qdrant_client, QDRANT_COLLECTION_NAME)
+    push_document_to_qdrant(document, get_worker_client(), collection_name)
 
-    # Closing qdrant client
-    qdrant_client.close()
 
+def get_worker_client() -> QdrantClient:
+    """
+    Get the Qdrant client of this process, opening it on first use.
 
-def embed_news_into_qdrant(
-    news_data: List[Dict],
-    num_processes: int,
-) -> None:
+    Returns:
+    - QdrantClient: The client.
     """
-    Embed news data into Qdrant.
+    global worker_qdrant_client
+    if worker_qdrant_client is None:
+        worker_qdrant_client = get_qdrant_client()
+    return worker_qdrant_client
+
+
+def close_worker_client() -> None:
+    """
+    Close the Qdrant client of this process, if it was opened.
+
+    Returns:
+    - None
+    """
+    global worker_qdrant_client
+    if worker_qdrant_client is not None:
+        worker_qdrant_client.close()
+        worker_qdrant_client = None
+
+
+def init_worker(plan: ExecutionPlan, worker_counter: multiprocessing.Value) -> None:
+    """
+    Pool initializer pinning each worker to its own CPU set and opening its Qdrant client.
 
     Args:
-    - news_data: List[Dict]: List of news articles.
-    - num_processes: int: Number of system processes.
+    - plan: ExecutionPlan: The execution plan of the pool.
+    - worker_counter: multiprocessing.Value: Shared counter handing out worker indices.
 
     Returns:
     - None
     """
-    logger.info(f"Number of system processes: {num_processes}")
-    if num_processes == 1:
-        for doc in tqdm(
-            news_data, total=len(news_data), desc="Processing", unit="news"
-        ):
-            process_and_push_document(doc)
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
 
-    else:
+    apply_plan(plan, worker_index)
+
+    # A forked worker must not reuse the connections of a client opened by the parent
+    global worker_qdrant_client
+    worker_qdrant_client = get_qdrant_client()
+
+
+def throttle(pending: deque, spill: SpillQueue, governor: ResourceGovernor) -> bool:
+    """
+    Sample the memory and spill the pending articles to disk when a fresh sample crosses the
+    limit. Spilling happens once per crossing: the memory that matters is held by the articles
+    in flight, so the pending ones are not rotated through the disk while it stays high.
+
+    Args:
+    - pending: deque: Articles waiting in memory.
+    - spill: SpillQueue: Articles waiting on disk.
+    - governor: ResourceGovernor: The resource governor.
+
+    Returns:
+    - bool: True if new articles may be submitted, False until the memory drops.
+    """
+    crossed = governor.update()
+
+    if crossed and pending:
+        logger.warning(
+            f"Memory over the limit, spilling {len(pending)} pending articles to disk"
+        )
+        spill.extend(list(pending))
+        pending.clear()
+
+    return not governor.over_limit
+
+
+def next_article(
+    pending: deque, spill: SpillQueue, governor: ResourceGovernor
+) -> Optional[Dict]:
+    """
+    Take the next article to process, reading spilled articles back a few at a time.
+
+    Args:
+    - pending: deque: Articles waiting in memory.
+    - spill: SpillQueue: Articles waiting on disk.
+    - governor: ResourceGovernor: The resource governor.
+
+    Returns:
+    - Optional[Dict]: The next article, None once all articles are taken.
+    """
+    if not pending and len(spill):
+        pending.extend(spill.pop(governor.in_flight))
+
+    return pending.popleft() if pending else None
+
+
+def retry_or_skip(
+    article: Dict, error: BaseException, retry: deque, attempts: Dict[tuple, int]
+) -> bool:
+    """
+    Queue a failed article to be tried again, or give up on it after `MAX_ATTEMPTS` attempts.
+
+    Args:
+    - article: Dict: The failed article.
+    - error: BaseException: Why it failed.
+    - retry: deque: Queue the article is put back at the front of.
+    - attempts: Dict[tuple, int]: Failed attempts of every article so far.
+
+    Returns:
+    - bool: True if the article was queued again, False if it was skipped.
+    """
+    key = (article.get("id"), article["headline"], article["date"])
+    attempts[key] = attempts.get(key, 0) + 1
+    if attempts[key] >= MAX_ATTEMPTS:
+        logger.error(
+            f"Skipping article '{article['headline']}' after {attempts[key]} attempts: {error}"
+        )
+        return False
+
+    logger.warning(f"Retrying article '{article['headline']}': {error}")
+    retry.appendleft(article)
+    return True
+
+
+def start_pool(plan: ExecutionPlan) -> ProcessPoolExecutor:
+    """
+    Start the worker processes of the plan and check that they come up.
+
+    Args:
+    - plan: ExecutionPlan: The execution plan of the pool.
+
+    Returns:
+    - ProcessPoolExecutor: The running pool.
+    """
+    # Forked workers share the model weights loaded by this process copy-on-write,
+    # spawned workers load their own copy.
+    context = multiprocessing.get_context("fork" if plan.share_model else "spawn")
+    pool = ProcessPoolExecutor(
+        max_workers=plan.num_processes,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(plan, context.Value("i", 0)),
+    )
+    try:
+        pool.submit(os.getpid).result()
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    return pool
+
+
+def run_pipeline(
+    pending: deque,
+    spill: SpillQueue,
+    plan: ExecutionPlan,
+    governor: ResourceGovernor,
+    progress: tqdm,
+    sparse_avg_length: Optional[float],
+    collection_name: str = QDRANT_COLLECTION_NAME,
+) -> int:
+    """
+    Process and push the pending articles, keeping at most `governor.in_flight` of them in the
+    pool at once. Finished articles are reaped in completion order, and no new article is
+    submitted while the memory is over the limit.
+
+    An article that raises is retried, then skipped. When a worker dies, e.g. killed for running
+    out of memory, the pool is restarted with a smaller batch size and in-flight limit, and the
+    articles it was processing are tried again one at a time, so the one that killed it is told
+    apart from the others and skipped after `MAX_ATTEMPTS`. The run only falls back to a single
+    process when the pool cannot start.
+
+    Args:
+    - pending: deque: Articles waiting in memory.
+    - spill: SpillQueue: Articles waiting on disk.
+    - plan: ExecutionPlan: Split of the work between processes and threads.
+    - governor: ResourceGovernor: The resource governor.
+    - progress: tqdm: The progress bar.
+    - sparse_avg_length: Optional[float]: Average number of words per chunk for BM25, None to
+      push the dense vectors only.
+    - collection_name: str: The Qdrant collection to push into.
+
+    Returns:
+    - int: The number of skipped articles.
+    """
+    logger.info(f"Number of system processes: {plan.num_processes}")
+    attempts = {}
+    skipped = 0
+
+    if plan.num_processes == 1:
+        apply_plan(plan)
         try:
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                _ = list(
-                    tqdm(
-                        pool.imap(process_and_push_document, news_data),
-                        total=len(news_data),
-                        desc="Processing",
-                        unit="news",
+            while True:
+                throttle(pending, spill, governor)
+                article = next_article(pending, spill, governor)
+                if article is None:
+                    break
+                try:
+                    process_and_push_document(
+                        article, governor.batch_size, sparse_avg_length, collection_name
                     )
+                except Exception as e:
+                    if retry_or_skip(article, e, pending, attempts):
+                        continue
+                    skipped += 1
+                progress.update()
+        finally:
+            close_worker_client()
+        return skipped
+
+    in_flight: Dict[Future, Dict] = {}
+    # Articles that were in the pool when a worker died, run alone until they are cleared
+    suspects = deque()
+    pool = None
+    try:
+        pool = start_pool(plan)
+        while True:
+            if suspects:
+                source = suspects
+                batch = [] if in_flight else [suspects.popleft()]
+            else:
+                source = pending
+                batch = []
+                # With nothing in flight the memory is not ours to wait for, keep going
+                if throttle(pending, spill, governor) or not in_flight:
+                    while len(in_flight) + len(batch) < governor.in_flight:
+                        article = next_article(pending, spill, governor)
+                        if article is None:
+                            break
+                        batch.append(article)
+
+            broken = None
+            for i, article in enumerate(batch):
+                try:
+                    future = pool.submit(
+                        process_and_push_document,
+                        article,
+                        governor.batch_size,
+                        sparse_avg_length,
+                        collection_name,
+                    )
+                except BrokenProcessPool as e:
+                    # The articles that were not submitted never ran
+                    source.extendleft(reversed(batch[i:]))
+                    broken = e
+                    break
+                in_flight[future] = article
+
+            if not in_flight and broken is None:
+                break
+
+            finished = set()
+            if in_flight:
+                finished, _ = wait(
+                    in_flight,
+                    timeout=governor.sample_interval,
+                    return_when=FIRST_COMPLETED,
+                )
+            for future in finished:
+                article = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    progress.update()
+                elif isinstance(error, BrokenProcessPool):
+                    broken = error
+                    in_flight[future] = article
+                elif not retry_or_skip(article, error, pending, attempts):
+                    skipped += 1
+                    progress.update()
+
+            if broken is None:
+                continue
+
+            # A dead pool loses every article it was processing. When it was processing a
+            # single one, that article is what killed it.
+            lost = []
+            for future, article in in_flight.items():
+                if future.done() and future.exception() is None:
+                    progress.update()
+                else:
+                    lost.append(article)
+            in_flight.clear()
+            if len(lost) == 1:
+                if not retry_or_skip(lost[0], broken, suspects, attempts):
+                    skipped += 1
+                    progress.update()
+            else:
+                logger.warning(
+                    f"Retrying the {len(lost)} articles of the dead pool one at a time"
                 )
-        except Exception as e:
-            logger.error(
-                f"Couldn't spawn {num_processes} processes. \nContinuing on a single process."
+                suspects.extend(lost)
+
+            logger.warning("A worker died, restarting the pool")
+            pool.shutdown(wait=True, cancel_futures=True)
+            pool = None
+            governor.back_off()
+            pool = start_pool(plan)
+    except (OSError, BrokenProcessPool, NotImplementedError) as e:
+        # Only a pool that fails to start is handled here, a running one handles its errors
+        if pool is not None:
+            raise
+        logger.error(
+            f"Couldn't spawn {plan.num_processes} processes: {e}\nContinuing on a single process."
+        )
+        pending.extendleft(reversed(list(suspects)))
+        skipped += run_pipeline(
+            pending,
+            spill,
+            replace(
+                plan,
+                num_processes=1,
+                threads_per_process=plan.num_processes * plan.threads_per_process,
+                cpu_sets=[],
+            ),
+            governor,
+            progress,
+            sparse_avg_length,
+            collection_name,
+        )
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    return skipped
+
+
+def embed_news_into_qdrant(
+    news_data: List[Dict],
+    plan: ExecutionPlan,
+    governor: ResourceGovernor,
+    sparse_avg_length: Optional[float] = None,
+    collection_name: str = QDRANT_COLLECTION_NAME,
+) -> None:
+    """
+    Embed news data into Qdrant.
+
+    Args:
+    - news_data: List[Dict]: List of news articles. The list is emptied so that articles
+      spilled to disk can be freed.
+    - plan: ExecutionPlan: Split of the work between processes and threads.
+    - governor: ResourceGovernor: Keeps the run under its memory limit.
+    - sparse_avg_length: Optional[float]: Average number of words per chunk for BM25, None to
+      push the dense vectors only.
+    - collection_name: str: The Qdrant collection to push into.
+
+    Returns:
+    - None
+    """
+    pending = deque(news_data)
+    news_data.clear()
+    spill = SpillQueue(SPILL_PATH / f"pending_{os.getpid()}.jsonl")
+
+    try:
+        with tqdm(total=len(pending), desc="Processing", unit="news") as progress:
+            skipped = run_pipeline(
+                pending,
+                spill,
+                plan,
+                governor,
+                progress,
+                sparse_avg_length,
+                collection_name,
             )
-            embed_news_into_qdrant(news_data, 1)
+    finally:
+        spill.close()
 
+    if skipped:
+        logger.error(f"Skipped {skipped} articles that could not be processed")
 
-def main(from_date: str, to_date: str, num_processes: int) -> None:
+
+def main(
+    from_date: str,
+    to_date: str,
+    num_processes: int,
+    threads_per_process: Optional[int],
+    share_model: bool,
+    memory_limit_gb: Optional[float],
+    max_batch_size: int,
+    collection_name: str,
+) -> None:
     """
     Main function to embed news data into Qdrant.
 
     Args:
     - from_date: str: Start date in the format 'YYYY-MM-DD'.
     - to_date: str: End date in the format 'YYYY-MM-DD'.
-    - num_processes: int: Number of system processes.
+    - num_processes: int: Maximum number of system processes, 0 to use all physical cores.
+    - threads_per_process: Optional[int]: Torch threads per process, None to derive it from the cores.
+    - share_model: bool: Share the model weights with the workers copy-on-write.
+    - memory_limit_gb: Optional[float]: Memory ceiling of the run, None for 80% of the memory usable by the run.
+    - max_batch_size: int: Maximum number of chunks embedded per forward pass.
+    - collection_name: str: The Qdrant collection to push into.
 
     Returns:
     - None
@@ -146,8 +531,41 @@ def main(from_date: str, to_date: str, num_processes: int) -> None:
     data = load_news(from_date, to_date)
     logger.info(f"Number of news articles: {len(data)}")
 
+    plan = plan_execution(
+        num_processes,
+        model_size_bytes(model),
+        share_model=share_model,
+        threads_per_process=threads_per_process,
+    )
+
+    if memory_limit_gb is None:
+        memory_limit = default_memory_limit()
+    else:
+        memory_limit = int(memory_limit_gb * 1024**3)
+    governor = ResourceGovernor(
+        memory_limit,
+        max_in_flight=2 * plan.num_processes,
+        max_batch_size=max_batch_size,
+    )
+    logger.info(f"Memory limit: {memory_limit / 1024**3:.1f} GB")
+
+    qdrant_client = init_collection(
+        get_qdrant_client(), collection_name, QDRANT_VECTOR_SIZE
+    )
+    create_keyword_indexes(qdrant_client, collection_name)
+    sparse = has_sparse_vectors(qdrant_client, collection_name)
+    qdrant_client.close()
+    sparse_avg_length = None
+    if sparse:
+        sparse_avg_length = average_chunk_length(data)
+        logger.info(f"Average chunk length for BM25: {sparse_avg_length:.1f} words")
+    else:
+        logger.warning(
+            f"Collection {collection_name} has no sparse vectors, pushing dense vectors only"
+        )
+
     logger.info("Processing and embedding news data into Qdrant")
-    embed_news_into_qdrant(data, num_processes)
+    embed_news_into_qdrant(data, plan, governor, sparse_avg_length, collection_name)
 
 
 if __name__ == "__main__":
@@ -162,13 +580,43 @@ if __name__ == "__main__":
         "--to_date",
         type=str,
         default="2024-01-30",
-        help="End date in the format 'YYYY-MM-DD'.",
+        help="End date in the format 'YYYY-MM-DD' (exclusive).",
     )
     parser.add_argument(
         "--num_processes",
         type=int,
         default=1,
-        help="Number of system processes.",
+        help="Maximum number of system processes, 0 to use all physical cores.",
+    )
+    parser.add_argument(
+        "--threads_per_process",
+        type=int,
+        default=None,
+        help="Torch threads per process. Defaults to the physical cores given to each process.",
+    )
+    parser.add_argument(
+        "--no_share_model",
+        action="store_true",
+        help="Load a separate model copy in every worker instead of sharing it copy-on-write.",
+    )
+    parser.add_argument(
+        "--memory_limit_gb",
+        type=float,
+        default=None,
+        help="Memory ceiling of the run in GB. Defaults to 80%% of the memory available to "
+        "the run, within its cgroup limit if it has one.",
+    )
+    parser.add_argument(
+        "--max_batch_size",
+        type=int,
+        default=64,
+        help="Maximum number of chunks embedded per forward pass.",
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default=QDRANT_COLLECTION_NAME,
+        help="The Qdrant collection to push into.",
     )
     args = parser.parse_args()
     logger.add(
@@ -178,4 +626,13 @@ if __name__ == "__main__":
         retention="20 days",
     )
 
-    main(args.from_date, args.to_date, args.num_processes)
+    main(
+        args.from_date,
+        args.to_date,
+        args.num_processes,
+        args.threads_per_process,
+        not args.no_share_model,
+        args.memory_limit_gb,
+        args.max_batch_size,
+        args.collection,
+    )
@@ -7,9 +7,10 @@ Usage:
 
 Arguments:
     --model (str): The name of the model to configure for data processing.
+    --context_token_budget (int): Compress each context to this many tokens of the most relevant sentences.
 """
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 from argparse import ArgumentParser
 
 import os
@@ -48,7 +49,9 @@ def configure_dspy(model_name: str) -> None:
     dspy.configure(lm=lm)
 
 
-def generate_data(examples: List[Dict]) -> List[Dict]:
+def generate_data(
+    examples: List[Dict], context_token_budget: Optional[int] = None
+) -> List[Dict]:
     """
     This function takes in the sample data we have to generate training data.
 
@@ -57,6 +60,7 @@ def generate_data(examples: List[Dict]) -> List[Dict]:
             about_me (str): User's Information and Query.
             context (str): Relevant factoid for answering the Query.
         }
+        context_token_budget (Optional[int]): Token budget of the compressed context, None to send the full context.
 
     Return:
         data (List[Dict]): A list of dicts {
@@ -65,7 +69,14 @@ def generate_data(examples: List[Dict]) -> List[Dict]:
             answer (str): Reasoning and resposne for the query based on the input.
         }
     """
-    lm_module = GenerateSuggestions()
+    compressor = None
+    if context_token_budget is not None:
+        from src.context_compression import ContextCompressor
+
+        logger.info(f"Compressing contexts to {context_token_budget} tokens")
+        compressor = ContextCompressor(context_token_budget)
+
+    lm_module = GenerateSuggestions(compressor)
 
     logger.info("Generating responses for the examples")
     data = []
@@ -78,6 +89,9 @@ def generate_data(examples: List[Dict]) -> List[Dict]:
 
         data.append(example)
 
+    if compressor is not None:
+        logger.info(compressor.summary())
+
     return data
 
 
@@ -101,7 +115,7 @@ def load_examples() -> Dict:
     return data
 
 
-def main(model_name: str) -> None:
+def main(model_name: str, context_token_budget: Optional[int] = None) -> None:
     """
     Main function to configure, generate, and save training data.
 
@@ -113,6 +127,7 @@ def main(model_name: str) -> None:
 
     Args:
         model_name (str): The name of the model to configure for data processing.
+        context_token_budget (Optional[int]): Token budget of the compressed context, None to send the full context.
 
     Returns:
         None
@@ -121,7 +136,7 @@ def main(model_name: str) -> None:
 
     examples = load_examples()
 
-    data = generate_data(examples)
+    data = generate_data(examples, context_token_budget)
     logger.info(f"Saving {len(data)} examples to {DATA_PATH / 'training_data.json'}")
     with open(DATA_PATH / "training_data.json", "w", encoding="utf-8") as file:
         json.dump(data, file)
@@ -136,6 +151,12 @@ if __name__ == "__main__":
         default="openai/gpt-4o-mini",
         choices=["openai/gpt-4o", "openai/gpt-4o-mini", "openai/gpt-3.5-turbo"],
     )
+    parser.add_argument(
+        "--context_token_budget",
+        type=int,
+        default=None,
+        help="Compress each context to this many tokens of the sentences most relevant to the query.",
+    )
     args = parser.parse_args()
 
-    main(args.model)
+    main(args.model, args.context_token_budget)
@@ -0,0 +1,109 @@
+"""
+This script exports the news collection to disk, imports an export back into Qdrant, and
+re-embeds an export under another model.
+
+Usage:
+    # Back up the collection
+    python scripts/migrate_collection.py export --collection alpaca_news --path data/exports/alpaca_news
+
+    # Restore it, or load it into another collection
+    python scripts/migrate_collection.py import --collection alpaca_news --path data/exports/alpaca_news
+
+    # Migrate to another embedding model
+    python scripts/migrate_collection.py reembed --path data/exports/alpaca_news \
+        --out_path data/exports/alpaca_news_mpnet --model "sentence-transformers/all-mpnet-base-v2"
+    python scripts/migrate_collection.py import --collection alpaca_news_mpnet --path data/exports/alpaca_news_mpnet \
+        --model "sentence-transformers/all-mpnet-base-v2"
+
+Arguments:
+    --collection (str): The name of the collection to export from or import into.
+    --path (str): The export directory.
+    --out_path (str): The export directory written by `reembed`.
+    --model (str): The model used by `reembed`. For `export` and `import`, the model the collection
+        is embedded with, `EMBEDDING_MODEL_NAME` by default. `import` refuses an export embedded
+        with another model.
+    --page_size (int): Points fetched per scroll request by `export`.
+    --batch_size (int): Points per upsert request for `import`, chunks per forward pass for `reembed`.
+    --parallel (int): Upload processes used by `import`.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.paths import EXPORTS_PATH
+from src.collection_io import export_collection, import_collection, reembed_export
+from src.news_documents import EMBEDDING_MODEL_NAME
+from src.vector_db_api import get_qdrant_client
+
+QDRANT_COLLECTION_NAME = "alpaca_news"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export a collection to disk.")
+    export_parser.add_argument("--collection", type=str, default=QDRANT_COLLECTION_NAME)
+    export_parser.add_argument(
+        "--path", type=str, default=str(EXPORTS_PATH / QDRANT_COLLECTION_NAME)
+    )
+    export_parser.add_argument("--page_size", type=int, default=1000)
+    export_parser.add_argument("--model", type=str, default=EMBEDDING_MODEL_NAME)
+
+    import_parser = subparsers.add_parser(
+        "import", help="Import an export into a collection."
+    )
+    import_parser.add_argument("--collection", type=str, default=QDRANT_COLLECTION_NAME)
+    import_parser.add_argument(
+        "--path", type=str, default=str(EXPORTS_PATH / QDRANT_COLLECTION_NAME)
+    )
+    import_parser.add_argument("--batch_size", type=int, default=256)
+    import_parser.add_argument("--parallel", type=int, default=4)
+    import_parser.add_argument("--model", type=str, default=EMBEDDING_MODEL_NAME)
+
+    reembed_parser = subparsers.add_parser(
+        "reembed", help="Re-embed the chunk text of an export under another model."
+    )
+    reembed_parser.add_argument("--path", type=str, required=True)
+    reembed_parser.add_argument("--out_path", type=str, required=True)
+    reembed_parser.add_argument("--model", type=str, required=True)
+    reembed_parser.add_argument("--batch_size", type=int, default=64)
+
+    args = parser.parse_args()
+
+    logger.add(
+        "logs/detailed_logs.log",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{function}:{line} | {message}",
+        rotation="50 MB",
+        retention="20 days",
+    )
+
+    if args.command == "reembed":
+        reembed_export(
+            Path(args.path), Path(args.out_path), args.model, args.batch_size
+        )
+    else:
+        qdrant_client = get_qdrant_client()
+        if args.command == "export":
+            export_collection(
+                qdrant_client,
+                args.collection,
+                Path(args.path),
+                args.page_size,
+                args.model,
+            )
+        else:
+            import_collection(
+                qdrant_client,
+                args.collection,
+                Path(args.path),
+                args.batch_size,
+                args.parallel,
+                args.model,
+            )
+        qdrant_client.close()
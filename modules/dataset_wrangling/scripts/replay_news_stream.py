@@ -0,0 +1,145 @@
+"""
+This script serves news from the news store over a local websocket, speaking the Alpaca news
+stream protocol. It stands in for the live stream when running `stream_news_into_qdrant.py`
+locally.
+
+Usage:
+    python scripts/replay_news_stream.py --from_date "2024-01-01" --to_date "2024-01-07" --rate 20
+
+Arguments:
+    --from_date (str): Start date of the replayed news in the format "YYYY-MM-DD".
+    --to_date (str): End date of the replayed news in the format "YYYY-MM-DD" (exclusive).
+    --rate (float): Articles sent per second.
+    --host (str): Host to listen on.
+    --port (int): Port to listen on.
+"""
+
+from typing import Dict, List
+
+import os
+import sys
+import json
+import asyncio
+from argparse import ArgumentParser
+from datetime import datetime
+
+import websockets
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.paths import NEWS_STORE_PATH
+from src.news_store import load_news_range
+
+
+def to_stream_message(article: Dict, article_id: int) -> Dict:
+    """
+    Convert an article of the news store into an Alpaca news stream message.
+
+    Args:
+        article (Dict): An article loaded from the news store.
+        article_id (int): The id of the message, for articles stored without their Alpaca id.
+
+    Returns:
+        Dict: The news stream message.
+    """
+    return {
+        "T": "n",
+        "id": article.get("id") or article_id,
+        "headline": article["headline"],
+        "summary": article["summary"],
+        "author": "",
+        "created_at": article["date"],
+        "updated_at": article["date"],
+        "url": "",
+        "content": article["content"],
+        "symbols": article.get("symbols", []),
+        "source": "replay",
+    }
+
+
+async def replay(websocket, news: List[Dict], rate: float) -> None:
+    """
+    Handle one client: go through the connect, auth and subscribe handshake, then send the news.
+
+    Args:
+        websocket: The client connection.
+        news (List[Dict]): The articles to replay.
+        rate (float): Articles sent per second.
+    """
+    await websocket.send(json.dumps([{"T": "success", "msg": "connected"}]))
+
+    request = json.loads(await websocket.recv())
+    if request.get("action") != "auth":
+        await websocket.send(
+            json.dumps([{"T": "error", "code": 401, "msg": "not authenticated"}])
+        )
+        return
+    await websocket.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+
+    request = json.loads(await websocket.recv())
+    symbols = request.get("news", ["*"])
+    await websocket.send(json.dumps([{"T": "subscription", "news": symbols}]))
+    logger.info(f"Replaying {len(news)} articles at {rate} articles/s")
+
+    for article_id, article in enumerate(news):
+        await websocket.send(json.dumps([to_stream_message(article, article_id)]))
+        await asyncio.sleep(1 / rate)
+
+    # Keep the connection open like the live stream would
+    logger.info("Replay finished")
+    await websocket.wait_closed()
+
+
+async def main(from_date: str, to_date: str, rate: float, host: str, port: int) -> None:
+    """
+    Serve the news of a date range until interrupted.
+
+    Args:
+        from_date (str): Start date in the format "YYYY-MM-DD".
+        to_date (str): End date in the format "YYYY-MM-DD".
+        rate (float): Articles sent per second.
+        host (str): Host to listen on.
+        port (int): Port to listen on.
+    """
+    news = load_news_range(
+        datetime.fromisoformat(from_date),
+        datetime.fromisoformat(to_date),
+        NEWS_STORE_PATH,
+    )
+    logger.info(f"Loaded {len(news)} articles to replay")
+
+    async with websockets.serve(lambda ws: replay(ws, news, rate), host, port):
+        logger.info(f"Replay server listening on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--from_date",
+        type=str,
+        default="2024-01-01",
+        help="Start date in the format 'YYYY-MM-DD'.",
+    )
+    parser.add_argument(
+        "--to_date",
+        type=str,
+        default="2024-01-07",
+        help="End date in the format 'YYYY-MM-DD'.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Articles sent per second.",
+    )
+    parser.add_argument(
+        "--host", type=str, default="localhost", help="Host to listen on."
+    )
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.from_date, args.to_date, args.rate, args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Stopped the replay server")
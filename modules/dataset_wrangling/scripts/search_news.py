@@ -0,0 +1,71 @@
+"""
+This script searches the news collection with a hybrid keyword and vector query.
+
+Usage:
+    python scripts/search_news.py --query "Should I buy AAPL after the earnings?" --limit 5
+
+Arguments:
+    --query (str): The question to search news for.
+    --keywords (List[str]): Keywords that must appear in the returned chunks.
+    --limit (int): The number of results.
+    --collection (str): The Qdrant collection to search.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.hybrid_search import hybrid_search
+from src.vector_db_api import get_qdrant_client
+
+QDRANT_COLLECTION_NAME = "alpaca_news"
+
+
+def main(query: str, keywords: list, limit: int, collection_name: str) -> None:
+    """
+    Run a hybrid search and log the best matching chunks.
+
+    Args:
+        query (str): The question to search news for.
+        keywords (list): Keywords that must appear in the returned chunks.
+        limit (int): The number of results.
+        collection_name (str): The Qdrant collection to search.
+    """
+    qdrant_client = get_qdrant_client()
+    points = hybrid_search(
+        qdrant_client, collection_name, query, limit=limit, keywords=keywords
+    )
+    qdrant_client.close()
+
+    for rank, point in enumerate(points, start=1):
+        logger.info(
+            f"{rank}. [{point.score:.3f}] {point.payload['date']} | "
+            f"{point.payload['headline']} | {point.payload['text'][:200]}"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--query", type=str, required=True, help="The question to search news for."
+    )
+    parser.add_argument(
+        "--keywords",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Keywords that must appear in the returned chunks.",
+    )
+    parser.add_argument("--limit", type=int, default=5, help="The number of results.")
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default=QDRANT_COLLECTION_NAME,
+        help="The Qdrant collection to search.",
+    )
+    args = parser.parse_args()
+
+    main(args.query, args.keywords, args.limit, args.collection)
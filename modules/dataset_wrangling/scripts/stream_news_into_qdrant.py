@@ -0,0 +1,160 @@
+"""
+This script runs a long-running service that ingests live news from the Alpaca news stream
+into Qdrant.
+
+Usage:
+    python scripts/stream_news_into_qdrant.py --batch_size 32 --max_batch_delay 0.5
+
+    # Against the local replay server (see scripts/replay_news_stream.py)
+    python scripts/stream_news_into_qdrant.py --url "ws://localhost:8765"
+
+Arguments:
+    --url (str): Websocket URL of the news stream.
+    --collection (str): The Qdrant collection to ingest into.
+    --symbols (List[str]): Symbols to subscribe to, "*" for all news.
+    --batch_size (int): Maximum number of articles per micro-batch.
+    --max_batch_delay (float): Maximum seconds an article waits for its batch to fill.
+    --max_queue_size (int): Maximum number of queued articles before backpressure kicks in.
+    --report_interval (float): Seconds between two stats reports.
+"""
+
+import os
+import sys
+import asyncio
+from argparse import ArgumentParser
+
+from dotenv import load_dotenv
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from src.news_documents import QDRANT_VECTOR_SIZE
+from src.news_stream import ALPACA_NEWS_STREAM_URL, NewsStreamIngestor
+from src.vector_db_api import (
+    get_async_qdrant_client,
+    get_qdrant_client,
+    init_collection,
+    create_keyword_indexes,
+    has_sparse_vectors,
+)
+
+QDRANT_COLLECTION_NAME = "alpaca_news"
+
+
+async def main(
+    url: str,
+    collection_name: str,
+    symbols: list,
+    batch_size: int,
+    max_batch_delay: float,
+    max_queue_size: int,
+    report_interval: float,
+) -> None:
+    """
+    Subscribe to the news stream and ingest the arriving articles until interrupted.
+
+    Args:
+        url (str): Websocket URL of the news stream.
+        collection_name (str): The Qdrant collection to ingest into.
+        symbols (list): Symbols to subscribe to.
+        batch_size (int): Maximum number of articles per micro-batch.
+        max_batch_delay (float): Maximum seconds an article waits for its batch to fill.
+        max_queue_size (int): Maximum number of queued articles.
+        report_interval (float): Seconds between two stats reports.
+    """
+    load_dotenv()
+
+    qdrant_client = get_qdrant_client()
+    qdrant_client = init_collection(qdrant_client, collection_name, QDRANT_VECTOR_SIZE)
+    create_keyword_indexes(qdrant_client, collection_name)
+    sparse = has_sparse_vectors(qdrant_client, collection_name)
+    qdrant_client.close()
+
+    async_qdrant_client = get_async_qdrant_client()
+    ingestor = NewsStreamIngestor(
+        async_qdrant_client,
+        collection_name,
+        key=os.getenv("APCA_API_KEY_ID", ""),
+        secret=os.getenv("APCA_API_SECRET_KEY", ""),
+        url=url,
+        symbols=symbols,
+        batch_size=batch_size,
+        max_batch_delay=max_batch_delay,
+        max_queue_size=max_queue_size,
+        report_interval=report_interval,
+        sparse=sparse,
+    )
+    try:
+        await ingestor.run()
+    finally:
+        logger.info(f"Stream ingest stats: {ingestor.stats.snapshot()}")
+        await async_qdrant_client.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=ALPACA_NEWS_STREAM_URL,
+        help="Websocket URL of the news stream.",
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default=QDRANT_COLLECTION_NAME,
+        help="The Qdrant collection to ingest into.",
+    )
+    parser.add_argument(
+        "--symbols",
+        type=str,
+        nargs="+",
+        default=["*"],
+        help="Symbols to subscribe to, '*' for all news.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=32,
+        help="Maximum number of articles per micro-batch.",
+    )
+    parser.add_argument(
+        "--max_batch_delay",
+        type=float,
+        default=0.5,
+        help="Maximum seconds an article waits for its batch to fill.",
+    )
+    parser.add_argument(
+        "--max_queue_size",
+        type=int,
+        default=1000,
+        help="Maximum number of queued articles before backpressure kicks in.",
+    )
+    parser.add_argument(
+        "--report_interval",
+        type=float,
+        default=30.0,
+        help="Seconds between two stats reports.",
+    )
+    args = parser.parse_args()
+
+    logger.add(
+        "logs/detailed_logs.log",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{function}:{line} | {message}",
+        rotation="50 MB",
+        retention="20 days",
+    )
+
+    try:
+        asyncio.run(
+            main(
+                args.url,
+                args.collection,
+                args.symbols,
+                args.batch_size,
+                args.max_batch_delay,
+                args.max_queue_size,
+                args.report_interval,
+            )
+        )
+    except KeyboardInterrupt:
+        logger.info("Stopped the news stream ingest")
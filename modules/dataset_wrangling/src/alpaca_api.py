@@ -1,5 +1,5 @@
 """
-This module contains functions to fetch news articles from the Alpaca API and save them to a JSON file.
+This module contains functions to fetch news articles from the Alpaca API and append them to the news store.
 """
 
 from typing import Tuple, List
@@ -7,13 +7,13 @@ import os
 import sys
 from pathlib import Path
 
-import json
 from datetime import datetime
 import requests
 from loguru import logger
 from dotenv import load_dotenv
 
-from src.paths import RAW_NEWS_PATH
+from src.paths import NEWS_STORE_PATH
+from src.news_store import append_news
 from src.utils import News
 
 load_dotenv()
@@ -80,59 +80,25 @@ def fetch_news_batch(
         summary = news["summary"]
         content = news["content"]
         date = datetime.fromisoformat(news["updated_at"])
+        symbols = news.get("symbols", [])
 
-        news_batch.append(News(headline, summary, content, date))
-
-    return news_batch, next_page_token
-
-
-def save_news_to_json(news: List[News], from_date: str, to_date: str) -> Path:
-    """
-    Save news to JSON file in the `data` directory
-
-    Args:
-        list_of_news (List[News]): A list of news articles
-        from_date (str): The start date
-        to_date (str): The end date
-
-    Returns:
-        Path: The path to the saved JSON file
-    """
-
-    os.makedirs(RAW_NEWS_PATH, exist_ok=True)
-
-    filename = RAW_NEWS_PATH / f"news_{from_date}_{to_date}.json"
-
-    # Save the news to a JSON file
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(
-            [
-                {
-                    "headline": news_article.headline,
-                    "summary": news_article.summary,
-                    "content": news_article.content,
-                    "date": news_article.date.isoformat(),
-                }
-                for news_article in news
-            ],
-            f,
-            ensure_ascii=False,
-            indent=4,
+        news_batch.append(
+            News(headline, summary, content, date, symbols, id=news.get("id"))
         )
 
-    return filename
+    return news_batch, next_page_token
 
 
 def download_historical_news(from_date: datetime, to_date: datetime) -> Path:
     """
-    Download news from Alpaca API and save to a JSON file in the `data` directory
+    Download news from Alpaca API and append them to the news store in the `data` directory
 
     Args:
         from_date (datetime): The start date
         to_date (datetime): The end date
 
     Returns:
-        Path: The path to the saved JSON file
+        Path: The path to the news store
     """
     # Fetch news from Alpaca API
     logger.info("Downloading news from Alpaca API...")
@@ -154,13 +120,9 @@ def download_historical_news(from_date: datetime, to_date: datetime) -> Path:
         f"Downloaded {len(list_of_news)} news articles between {from_date} and {to_date}"
     )
 
-    # Save news to JSON file
-    logger.info("Saving news to JSON")
-    filename = save_news_to_json(
-        list_of_news,
-        from_date.strftime("%Y-%m-%d"),
-        to_date.strftime("%Y-%m-%d"),
-    )
-    logger.info(f"News saved to {filename}")
+    # Append news to the news store
+    logger.info("Appending news to the news store")
+    num_new = append_news(list_of_news, NEWS_STORE_PATH)
+    logger.info(f"Stored {num_new} new news articles in {NEWS_STORE_PATH}")
 
-    return filename
+    return NEWS_STORE_PATH
@@ -0,0 +1,292 @@
+"""
+This module contains functions to export a qdrant collection to disk, import it back, and
+re-embed an export under another model.
+
+An export is a directory holding:
+    - `vectors.npy`: the dense vectors as a float32 matrix, written and read memory-mapped
+    - `points.jsonl`: one line per point, in the same order, with its id, payload and sparse vector
+    - `manifest.json`: the number of points, the vector size and the embedding model
+
+An export is only imported into a collection searched with the model it was embedded with.
+"""
+
+from typing import Dict, Iterator, Optional
+
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, SparseVector
+from tqdm import tqdm
+
+from src.news_documents import (
+    EMBEDDING_MODEL_NAME,
+    load_embedder,
+    embed_texts,
+    sparse_embed_texts,
+)
+from src.vector_db_api import SPARSE_VECTOR_NAME, init_collection, has_sparse_vectors
+
+VECTORS_FILE = "vectors.npy"
+POINTS_FILE = "points.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+def _write_manifest(
+    path: Path, count: int, vector_size: int, model: Optional[str]
+) -> None:
+    with open(path / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {"count": count, "vector_size": vector_size, "model": model}, f, indent=4
+        )
+
+
+def load_manifest(path: Path) -> Dict:
+    """
+    Load the manifest of an export
+
+    Args:
+        path (Path): The export directory
+
+    Returns:
+        Dict: The number of points, the vector size and the embedding model of the export
+    """
+    with open(path / MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_collection(
+    qdrant_client: QdrantClient,
+    collection_name: str,
+    path: Path,
+    page_size: int = 1000,
+    model: str = EMBEDDING_MODEL_NAME,
+) -> int:
+    """
+    Scroll through the collection in large pages and write its points to an export directory
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+        path (Path): The export directory
+        page_size (int): The number of points fetched per scroll request
+        model (str): The embedding model of the collection, recorded in the manifest
+
+    Returns:
+        int: The number of exported points
+    """
+    os.makedirs(path, exist_ok=True)
+
+    count = qdrant_client.count(collection_name=collection_name, exact=True).count
+    params = qdrant_client.get_collection(collection_name=collection_name).config.params
+    vector_size = params.vectors.size
+
+    vectors = np.lib.format.open_memmap(
+        path / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(count, vector_size)
+    )
+
+    exported, offset = 0, None
+    with open(path / POINTS_FILE, "w", encoding="utf-8") as f, tqdm(
+        total=count, desc="Exporting", unit="points"
+    ) as progress:
+        while exported < count:
+            points, offset = qdrant_client.scroll(
+                collection_name=collection_name,
+                limit=min(page_size, count - exported),
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+
+            for point in points:
+                dense, sparse = point.vector, None
+                if isinstance(point.vector, dict):
+                    dense = point.vector[""]
+                    sparse = point.vector.get(SPARSE_VECTOR_NAME)
+
+                vectors[exported] = dense
+                record = {"id": point.id, "payload": point.payload}
+                if sparse is not None:
+                    record["sparse"] = {
+                        "indices": sparse.indices,
+                        "values": sparse.values,
+                    }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                exported += 1
+
+            progress.update(len(points))
+            if offset is None:
+                break
+
+    vectors.flush()
+    del vectors
+    _write_manifest(path, exported, vector_size, model)
+    logger.info(f"Exported {exported} points of {collection_name} to {path}")
+
+    return exported
+
+
+def _iter_points(path: Path, sparse: bool) -> Iterator[PointStruct]:
+    """
+    Read the points of an export back, one at a time
+
+    Args:
+        path (Path): The export directory
+        sparse (bool): Whether to attach the sparse vectors to the points
+
+    Yields:
+        PointStruct: The points, in export order
+    """
+    vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+
+    with open(path / POINTS_FILE, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            record = json.loads(line)
+            vector = vectors[i].tolist()
+            if sparse and "sparse" in record:
+                vector = {
+                    "": vector,
+                    SPARSE_VECTOR_NAME: SparseVector(**record["sparse"]),
+                }
+
+            yield PointStruct(id=record["id"], vector=vector, payload=record["payload"])
+
+
+def import_collection(
+    qdrant_client: QdrantClient,
+    collection_name: str,
+    path: Path,
+    batch_size: int = 256,
+    parallel: int = 4,
+    model: str = EMBEDDING_MODEL_NAME,
+) -> int:
+    """
+    Upsert the points of an export into a collection, creating it if it does not exist
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+        path (Path): The export directory
+        batch_size (int): The number of points per upsert request
+        parallel (int): The number of upload processes
+        model (str): The embedding model the collection is searched with
+
+    Returns:
+        int: The number of imported points
+
+    Raises:
+        ValueError: If the export was embedded with another model, or has another vector size
+            than the existing collection
+    """
+    manifest = load_manifest(path)
+    if manifest["model"] is None:
+        logger.warning(
+            f"Export {path} does not record its embedding model, assuming {model}"
+        )
+    elif manifest["model"] != model:
+        raise ValueError(
+            f"Export {path} was embedded with {manifest['model']}, "
+            f"not with {model} used to search {collection_name}"
+        )
+    if qdrant_client.collection_exists(collection_name=collection_name):
+        params = qdrant_client.get_collection(collection_name).config.params
+        if params.vectors.size != manifest["vector_size"]:
+            raise ValueError(
+                f"Export {path} holds {manifest['vector_size']}-d vectors, "
+                f"collection {collection_name} holds {params.vectors.size}-d vectors"
+            )
+
+    init_collection(qdrant_client, collection_name, manifest["vector_size"])
+    sparse = has_sparse_vectors(qdrant_client, collection_name)
+    if not sparse:
+        logger.warning(
+            f"Collection {collection_name} has no sparse vectors, importing dense vectors only"
+        )
+
+    qdrant_client.upload_points(
+        collection_name=collection_name,
+        points=tqdm(
+            _iter_points(path, sparse),
+            total=manifest["count"],
+            desc="Importing",
+            unit="points",
+        ),
+        batch_size=batch_size,
+        parallel=parallel,
+        wait=True,
+    )
+    logger.info(
+        f"Imported {manifest['count']} points from {path} into {collection_name}"
+    )
+
+    return manifest["count"]
+
+
+def reembed_export(
+    path: Path, out_path: Path, model_name: str, batch_size: int = 64
+) -> int:
+    """
+    Re-embed the chunk text stored in the payloads of an export under another model, without
+    re-parsing the articles. The BM25 sparse vectors do not depend on the model and are kept,
+    points exported without one get one built from their text.
+
+    Args:
+        path (Path): The export directory to read
+        out_path (Path): The export directory to write
+        model_name (str): The name of the new model on the Hugging Face hub
+        batch_size (int): The number of chunks per forward pass
+
+    Returns:
+        int: The number of re-embedded points
+    """
+    os.makedirs(out_path, exist_ok=True)
+
+    count = load_manifest(path)["count"]
+    embedder = load_embedder(model_name)
+    vector_size = embedder[1].config.hidden_size
+
+    vectors = np.lib.format.open_memmap(
+        out_path / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(count, vector_size)
+    )
+
+    def flush(records, start):
+        texts = [record["payload"]["text"] for record in records]
+        vectors[start : start + len(records)] = embed_texts(texts, batch_size, embedder)
+        missing = [record for record in records if "sparse" not in record]
+        if missing:
+            sparse_embeddings = sparse_embed_texts(
+                [record["payload"]["text"] for record in missing]
+            )
+            for record, sparse in zip(missing, sparse_embeddings):
+                record["sparse"] = sparse
+        for record in records:
+            f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    done = 0
+    with open(path / POINTS_FILE, "r", encoding="utf-8") as f_in, open(
+        out_path / POINTS_FILE, "w", encoding="utf-8"
+    ) as f_out, tqdm(total=count, desc="Re-embedding", unit="points") as progress:
+        records = []
+        for line in f_in:
+            records.append(json.loads(line))
+            if len(records) == batch_size:
+                flush(records, done)
+                done += len(records)
+                progress.update(len(records))
+                records = []
+        if records:
+            flush(records, done)
+            done += len(records)
+            progress.update(len(records))
+
+    vectors.flush()
+    del vectors
+    _write_manifest(out_path, done, vector_size, model_name)
+    logger.info(
+        f"Re-embedded {done} points from {path} into {out_path} with {model_name}"
+    )
+
+    return done
@@ -0,0 +1,129 @@
+"""
+This module contains a class to compress the context sent to the LLM by keeping only the sentences
+most similar to the user's query, within a token budget.
+"""
+
+from typing import List
+from dataclasses import dataclass
+
+import time
+
+import numpy as np
+from loguru import logger
+from unstructured.nlp.tokenize import sent_tokenize
+
+from src.news_documents import tokenizer, embed_texts
+
+
+@dataclass
+class CompressionResult:
+    """
+    Dataclass for the compressed context and what the compression saved
+    """
+
+    context: str
+    original_tokens: int
+    compressed_tokens: int
+    latency: float
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compressed_tokens
+
+
+class ContextCompressor:
+    """
+    Splits the context into sentences, scores them against the user's query with the MiniLM
+    embedder and keeps the best scoring sentences, in their original order, within a budget of
+    MiniLM tokens.
+    """
+
+    def __init__(self, token_budget: int = 128):
+        self.token_budget = token_budget
+        self.calls = 0
+        self.total_tokens_saved = 0
+        self.total_latency = 0.0
+
+    def compress(self, query: str, context: str) -> CompressionResult:
+        """
+        Compress the context for the given query.
+
+        Args:
+            query (str): User's Information and Query.
+            context (str): The context to compress.
+
+        Returns:
+            CompressionResult: The compressed context with the tokens saved and the latency.
+        """
+        start = time.perf_counter()
+
+        sentences = sent_tokenize(context)
+        lengths = [len(tokenizer.tokenize(sentence)) for sentence in sentences]
+        original_tokens = sum(lengths)
+
+        if original_tokens <= self.token_budget:
+            compressed = context
+            compressed_tokens = original_tokens
+        else:
+            selected = self._select(query, sentences, lengths)
+            compressed = " ".join(sentences[i] for i in selected)
+            compressed_tokens = sum(lengths[i] for i in selected)
+
+        result = CompressionResult(
+            context=compressed,
+            original_tokens=original_tokens,
+            compressed_tokens=compressed_tokens,
+            latency=time.perf_counter() - start,
+        )
+
+        self.calls += 1
+        self.total_tokens_saved += result.tokens_saved
+        self.total_latency += result.latency
+        logger.debug(
+            f"Compressed context from {result.original_tokens} to {result.compressed_tokens} "
+            f"tokens in {result.latency * 1000:.1f} ms"
+        )
+
+        return result
+
+    def _select(
+        self, query: str, sentences: List[str], lengths: List[int]
+    ) -> List[int]:
+        """
+        Pick the indices of the sentences to keep.
+
+        Args:
+            query (str): User's Information and Query.
+            sentences (List[str]): The sentences of the context.
+            lengths (List[int]): The number of tokens of every sentence.
+
+        Returns:
+            List[int]: The indices of the kept sentences, in their original order.
+        """
+        embeddings = np.array(embed_texts([query] + sentences))
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = embeddings[1:] @ embeddings[0]
+
+        selected, budget = [], self.token_budget
+        for i in np.argsort(-scores):
+            if lengths[i] <= budget:
+                selected.append(int(i))
+                budget -= lengths[i]
+
+        # Always keep at least the best sentence, even if it is over the budget
+        return sorted(selected) if selected else [int(np.argmax(scores))]
+
+    def summary(self) -> str:
+        """
+        Summarize the compression over all calls for logging.
+
+        Returns:
+            str: A human readable summary
+        """
+        if not self.calls:
+            return "No context was compressed"
+        return (
+            f"Compressed {self.calls} contexts, saving {self.total_tokens_saved} tokens "
+            f"({self.total_tokens_saved / self.calls:.1f} per call) in "
+            f"{self.total_latency / self.calls * 1000:.1f} ms per call"
+        )
@@ -2,8 +2,13 @@
 This module contains classes to generate suggestions for the user's query using Chain of Thought reasoning.
 """
 
+from typing import Optional, TYPE_CHECKING
+
 import dspy
 
+if TYPE_CHECKING:
+    from src.context_compression import ContextCompressor
+
 
 class ResponseSignature(dspy.Signature):
     """Generate a tailored answer to the user's question using the context and user's information"""
@@ -22,13 +27,15 @@ class ResponseSignature(dspy.Signature):
 class GenerateSuggestions(dspy.Module):
     """
     DSPY module for generating LLM responses for user's query provided the context by using Chain of Thought reasoning.
+    When a compressor is given, the context is first cut down to the sentences most relevant to the query.
     """
 
-    def __init__(self):
+    def __init__(self, compressor: Optional["ContextCompressor"] = None):
         super().__init__()
         self.cot = dspy.ChainOfThought(ResponseSignature)
+        self.compressor = compressor
 
-    def forward(self, about_me: str, context: str) -> str:
+    def forward(self, about_me: str, context: str) -> dspy.Prediction:
         """
         Forward function takes user's info and the context.
         Generates LLM response using Chain of Thought reasoning.
@@ -38,7 +45,15 @@ class GenerateSuggestions(dspy.Module):
             context (str): Relevant factoid for answering the Query.
 
         Returns:
-            output (Dict): Returns reasoning and response for the given query.
+            output (dspy.Prediction): Returns reasoning and response for the given query.
+                When a compressor is given, `compression` holds the `CompressionResult` of
+                the call, with the tokens saved and the compression latency.
         """
+        compression = None
+        if self.compressor is not None:
+            compression = self.compressor.compress(about_me, context)
+            context = compression.context
+
         output = self.cot(user_query=about_me, context=context)
+        output.compression = compression
         return output
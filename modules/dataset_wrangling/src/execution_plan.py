@@ -0,0 +1,162 @@
+"""
+This module contains functions to plan how the embedding work is split between processes and
+per-process torch threads, based on the CPU topology and the available memory.
+"""
+
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+
+import os
+from collections import defaultdict
+
+import psutil
+import torch
+from loguru import logger
+
+# Rough resident memory of a worker besides the model weights (python, torch, tokenizers, ...)
+WORKER_OVERHEAD_BYTES = 512 * 1024**2
+
+
+@dataclass
+class ExecutionPlan:
+    """
+    Dataclass for the split of the embedding work between processes and threads
+    """
+
+    num_processes: int
+    threads_per_process: int
+    share_model: bool
+    cpu_sets: List[List[int]] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """
+        Describe the plan in one line for logging.
+
+        Returns:
+            str: A human readable description of the plan
+        """
+        cpu_sets = self.cpu_sets if self.cpu_sets else "unpinned"
+        return (
+            f"{self.num_processes} process(es) x {self.threads_per_process} thread(s), "
+            f"shared model: {self.share_model}, cpu sets: {cpu_sets}"
+        )
+
+
+def physical_cores(cpus: List[int]) -> List[List[int]]:
+    """
+    Group the logical CPUs by the physical core they belong to, using the Linux sysfs topology.
+    Every CPU is treated as its own core when the topology is not available.
+
+    Args:
+        cpus (List[int]): The logical CPUs this process may run on
+
+    Returns:
+        List[List[int]]: The logical CPUs of every physical core, ordered by socket and core
+    """
+    cores: Dict[tuple, List[int]] = defaultdict(list)
+    for cpu in cpus:
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{topology}/physical_package_id", "r", encoding="utf-8") as f:
+                package_id = int(f.read())
+            with open(f"{topology}/core_id", "r", encoding="utf-8") as f:
+                core_id = int(f.read())
+        except (OSError, ValueError):
+            package_id, core_id = 0, cpu
+        cores[(package_id, core_id)].append(cpu)
+
+    return [sorted(cores[key]) for key in sorted(cores)]
+
+
+def model_size_bytes(model: torch.nn.Module) -> int:
+    """
+    Compute the memory held by the parameters and buffers of a model.
+
+    Args:
+        model (torch.nn.Module): The model
+
+    Returns:
+        int: The size of the model weights in bytes
+    """
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def plan_execution(
+    num_processes: int,
+    model_bytes: int,
+    share_model: bool = True,
+    threads_per_process: Optional[int] = None,
+) -> ExecutionPlan:
+    """
+    Pick the number of processes and threads per process for the embedding pool.
+
+    Workers are given whole physical cores, one torch thread per core, so that the processes
+    together never run more threads than there are cores. The number of processes is capped
+    by the available memory, counting the model weights once when they are shared with the
+    workers copy-on-write and once per worker otherwise.
+
+    Args:
+        num_processes (int): The requested number of processes, 0 to pick it automatically
+        model_bytes (int): The size of the model weights in bytes
+        share_model (bool): Whether the workers share the parent's model weights
+        threads_per_process (Optional[int]): Force the number of torch threads per process
+
+    Returns:
+        ExecutionPlan: The chosen plan
+    """
+    pinnable = hasattr(os, "sched_setaffinity")
+    if pinnable:
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    cores = physical_cores(cpus)
+
+    # Memory bound
+    available = psutil.virtual_memory().available
+    per_worker = WORKER_OVERHEAD_BYTES + (0 if share_model else model_bytes)
+    fixed = model_bytes if share_model else 0
+    max_by_memory = max(1, (available - fixed) // per_worker)
+
+    # CPU bound
+    num_processes = num_processes or len(cores)
+    num_processes = int(max(1, min(num_processes, len(cores), max_by_memory)))
+    if num_processes < len(cores) and num_processes == max_by_memory:
+        logger.warning(
+            f"Limiting the pool to {num_processes} process(es) to fit in "
+            f"{available / 1024**3:.1f} GB of available memory"
+        )
+
+    # Hand out whole cores to every process
+    cores_per_process = len(cores) // num_processes
+    cpu_sets = []
+    if pinnable and num_processes > 1:
+        for i in range(num_processes):
+            assigned = cores[i * cores_per_process : (i + 1) * cores_per_process]
+            cpu_sets.append(sorted(cpu for core in assigned for cpu in core))
+
+    plan = ExecutionPlan(
+        num_processes=num_processes,
+        threads_per_process=threads_per_process or max(1, cores_per_process),
+        share_model=share_model,
+        cpu_sets=cpu_sets,
+    )
+    logger.info(f"Execution plan: {plan.describe()}")
+
+    return plan
+
+
+def apply_plan(plan: ExecutionPlan, worker_index: Optional[int] = None) -> None:
+    """
+    Pin the current process to its CPU set and limit its torch threads according to the plan.
+
+    Args:
+        plan (ExecutionPlan): The execution plan
+        worker_index (Optional[int]): The index of the pool worker, None for the main process
+    """
+    if worker_index is not None and plan.cpu_sets:
+        cpus = plan.cpu_sets[worker_index % len(plan.cpu_sets)]
+        os.sched_setaffinity(0, cpus)
+        logger.debug(f"Worker {worker_index} pinned to CPUs {cpus}")
+
+    torch.set_num_threads(plan.threads_per_process)
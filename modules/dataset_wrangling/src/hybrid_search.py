@@ -0,0 +1,373 @@
+"""
+This module contains functions to search the news collection with a hybrid query: the results of
+the dense vector search and of the BM25 keyword search are prefiltered by ticker and keyword,
+then fused by reciprocal rank.
+
+Collections created before the sparse vectors were added are searched with the dense vectors
+only, using the same prefilter.
+
+Whether a collection has sparse vectors and which tickers it has news about are cached per client
+and collection, so repeated queries do not ask Qdrant again.
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import re
+import asyncio
+import weakref
+from dataclasses import dataclass, field
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    FieldCondition,
+    Filter,
+    Fusion,
+    FusionQuery,
+    MatchAny,
+    MatchText,
+    MatchValue,
+    Prefetch,
+    ScoredPoint,
+)
+from qdrant_client.models import SparseVector
+
+from src.news_documents import embed_texts, sparse_embed_texts
+from src.vector_db_api import (
+    SPARSE_VECTOR_NAME,
+    has_sparse_vectors,
+    has_sparse_vectors_async,
+)
+
+# Cashtags ($AAPL) always name a ticker
+CASHTAG_PATTERN = re.compile(r"(?<![\w$])\$([A-Za-z]{1,5})\b")
+# Bare upper-case words of 2 to 5 letters only name a ticker if the collection has news about it
+WORD_PATTERN = re.compile(r"(?<![\w$])([A-Z]{2,5})\b")
+# Tickers that are also common words in questions, only taken as tickers when written as cashtags
+AMBIGUOUS_TICKERS = set(
+    "AI ALL ARE BIG CAN CEO EPS ETF EV FOR GDP GO IPO IT NEW NOW ON ONE OUT SO US USA".split()
+)
+
+
+@dataclass
+class CollectionCache:
+    """
+    What is known about a collection: whether it has sparse vectors, and the tickers found in
+    its `symbols` index. Only found tickers are kept, since news about new tickers keeps coming.
+    """
+
+    sparse: Optional[bool] = None
+    tickers: set = field(default_factory=set)
+
+
+# Dropped with their client
+_collection_caches = weakref.WeakKeyDictionary()
+
+
+def collection_cache(
+    qdrant_client: Union[QdrantClient, AsyncQdrantClient], collection_name: str
+) -> CollectionCache:
+    """
+    Get the cache of a collection for a client, sync or async
+
+    Args:
+        qdrant_client (Union[QdrantClient, AsyncQdrantClient]): The qdrant client
+        collection_name (str): The name of the collection
+
+    Returns:
+        CollectionCache: The cache of the collection
+    """
+    caches = _collection_caches.setdefault(qdrant_client, {})
+    return caches.setdefault(collection_name, CollectionCache())
+
+
+def extract_tickers(query: str) -> Tuple[List[str], List[str]]:
+    """
+    Extract the ticker-like words of a query
+
+    Args:
+        query (str): The user's query
+
+    Returns:
+        Tuple[List[str], List[str]]: The cashtag tickers, and the bare upper-case words that
+            still need to be checked against the collection, in order of appearance
+    """
+    cashtags = list(
+        dict.fromkeys(ticker.upper() for ticker in CASHTAG_PATTERN.findall(query))
+    )
+    candidates = [
+        word
+        for word in dict.fromkeys(WORD_PATTERN.findall(query))
+        if word not in cashtags and word not in AMBIGUOUS_TICKERS
+    ]
+    return cashtags, candidates
+
+
+def _ticker_filter(ticker: str) -> Filter:
+    return Filter(must=[FieldCondition(key="symbols", match=MatchValue(value=ticker))])
+
+
+def resolve_tickers(
+    qdrant_client: QdrantClient, collection_name: str, query: str
+) -> List[str]:
+    """
+    Find the tickers named in the query: its cashtags, and the bare upper-case words found in
+    the `symbols` keyword index of the collection
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+        query (str): The user's query
+
+    Returns:
+        List[str]: The ticker symbols to prefilter on
+    """
+    cashtags, candidates = extract_tickers(query)
+    cache = collection_cache(qdrant_client, collection_name)
+    for candidate in candidates:
+        if candidate not in cache.tickers and (
+            qdrant_client.count(
+                collection_name=collection_name,
+                count_filter=_ticker_filter(candidate),
+                exact=False,
+            ).count
+        ):
+            cache.tickers.add(candidate)
+
+    return cashtags + [
+        candidate for candidate in candidates if candidate in cache.tickers
+    ]
+
+
+async def resolve_tickers_async(
+    qdrant_client: AsyncQdrantClient, collection_name: str, query: str
+) -> List[str]:
+    """
+    Async version of `resolve_tickers`
+
+    Args:
+        qdrant_client (AsyncQdrantClient): The async qdrant client
+        collection_name (str): The name of the collection
+        query (str): The user's query
+
+    Returns:
+        List[str]: The ticker symbols to prefilter on
+    """
+    cashtags, candidates = extract_tickers(query)
+    cache = collection_cache(qdrant_client, collection_name)
+    unknown = [candidate for candidate in candidates if candidate not in cache.tickers]
+    counts = await asyncio.gather(
+        *(
+            qdrant_client.count(
+                collection_name=collection_name,
+                count_filter=_ticker_filter(candidate),
+                exact=False,
+            )
+            for candidate in unknown
+        )
+    )
+    cache.tickers.update(
+        candidate for candidate, count in zip(unknown, counts) if count.count
+    )
+
+    return cashtags + [
+        candidate for candidate in candidates if candidate in cache.tickers
+    ]
+
+
+def build_filter(tickers: List[str], keywords: List[str]) -> Optional[Filter]:
+    """
+    Build the prefilter matching any of the tickers and all of the keywords
+
+    Args:
+        tickers (List[str]): Ticker symbols, matched against the `symbols` payload
+        keywords (List[str]): Keywords that must appear in the chunk text
+
+    Returns:
+        Optional[Filter]: The filter, None when there is nothing to filter on
+    """
+    conditions = [
+        FieldCondition(key="text", match=MatchText(text=keyword))
+        for keyword in keywords
+    ]
+    if tickers:
+        conditions.append(FieldCondition(key="symbols", match=MatchAny(any=tickers)))
+
+    return Filter(must=conditions) if conditions else None
+
+
+def encode_query(
+    query: str, sparse: bool = True
+) -> Tuple[List[float], Optional[SparseVector]]:
+    """
+    Encode the query into its dense vector and its BM25 sparse vector
+
+    Args:
+        query (str): The user's query
+        sparse (bool): Also compute the sparse vector
+
+    Returns:
+        Tuple[List[float], Optional[SparseVector]]: The dense and the sparse vectors of the
+            query, the sparse one is None when not computed
+    """
+    dense = embed_texts([query])[0]
+    if not sparse:
+        return dense, None
+    return dense, SparseVector(**sparse_embed_texts([query], query=True)[0])
+
+
+def build_prefetch(
+    dense: List[float],
+    sparse: SparseVector,
+    query_filter: Optional[Filter],
+    prefetch_limit: int,
+) -> List[Prefetch]:
+    """
+    Build the dense and sparse searches whose rankings are fused
+
+    Args:
+        dense (List[float]): The dense vector of the query
+        sparse (SparseVector): The sparse vector of the query
+        query_filter (Optional[Filter]): The prefilter applied to both searches
+        prefetch_limit (int): The number of candidates taken from each search
+
+    Returns:
+        List[Prefetch]: The two searches
+    """
+    return [
+        Prefetch(query=dense, filter=query_filter, limit=prefetch_limit),
+        Prefetch(
+            query=sparse,
+            using=SPARSE_VECTOR_NAME,
+            filter=query_filter,
+            limit=prefetch_limit,
+        ),
+    ]
+
+
+def build_query(
+    dense: List[float],
+    sparse: Optional[SparseVector],
+    query_filter: Optional[Filter],
+    limit: int,
+    prefetch_limit: int,
+) -> Dict:
+    """
+    Build the arguments of `query_points`: the reciprocal rank fusion of the dense and sparse
+    searches, or the dense search alone when there is no sparse vector
+
+    Args:
+        dense (List[float]): The dense vector of the query
+        sparse (Optional[SparseVector]): The sparse vector of the query
+        query_filter (Optional[Filter]): The prefilter
+        limit (int): The number of results
+        prefetch_limit (int): The number of candidates taken from each search before fusion
+
+    Returns:
+        Dict: The keyword arguments of `query_points`, without the collection name
+    """
+    if sparse is None:
+        return {
+            "query": dense,
+            "query_filter": query_filter,
+            "limit": limit,
+            "with_payload": True,
+        }
+
+    return {
+        "prefetch": build_prefetch(dense, sparse, query_filter, prefetch_limit),
+        "query": FusionQuery(fusion=Fusion.RRF),
+        "limit": limit,
+        "with_payload": True,
+    }
+
+
+def hybrid_search(
+    qdrant_client: QdrantClient,
+    collection_name: str,
+    query: str,
+    limit: int = 10,
+    keywords: Optional[List[str]] = None,
+    prefetch_limit: int = 50,
+) -> List[ScoredPoint]:
+    """
+    Search the collection with the dense and the BM25 sparse vectors of the query and fuse both
+    rankings with reciprocal rank fusion.
+
+    Both searches are prefiltered on the tickers named in the query and on the given keywords,
+    so they only score the matching chunks. If the ticker filter leaves fewer than `limit`
+    results, the search is run again without it. Collections without sparse vectors are
+    searched with the dense vectors only.
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+        query (str): The user's query
+        limit (int): The number of results
+        keywords (Optional[List[str]]): Keywords that must appear in the chunk text
+        prefetch_limit (int): The number of candidates taken from each search before fusion
+
+    Returns:
+        List[ScoredPoint]: The best matching chunks with their payloads
+    """
+    keywords = keywords or []
+    tickers = resolve_tickers(qdrant_client, collection_name, query)
+    cache = collection_cache(qdrant_client, collection_name)
+    if cache.sparse is None:
+        cache.sparse = has_sparse_vectors(qdrant_client, collection_name)
+    dense, sparse = encode_query(query, sparse=cache.sparse)
+
+    def search(query_filter: Optional[Filter]) -> List[ScoredPoint]:
+        return qdrant_client.query_points(
+            collection_name=collection_name,
+            **build_query(dense, sparse, query_filter, limit, prefetch_limit),
+        ).points
+
+    points = search(build_filter(tickers, keywords))
+    if tickers and len(points) < limit:
+        points = search(build_filter([], keywords))
+
+    return points
+
+
+async def hybrid_search_async(
+    qdrant_client: AsyncQdrantClient,
+    collection_name: str,
+    query: str,
+    limit: int = 10,
+    keywords: Optional[List[str]] = None,
+    prefetch_limit: int = 50,
+) -> List[ScoredPoint]:
+    """
+    Async version of `hybrid_search`. The query is encoded in a worker thread so the event
+    loop keeps serving other requests.
+
+    Args:
+        qdrant_client (AsyncQdrantClient): The async qdrant client
+        collection_name (str): The name of the collection
+        query (str): The user's query
+        limit (int): The number of results
+        keywords (Optional[List[str]]): Keywords that must appear in the chunk text
+        prefetch_limit (int): The number of candidates taken from each search before fusion
+
+    Returns:
+        List[ScoredPoint]: The best matching chunks with their payloads
+    """
+    keywords = keywords or []
+    tickers = await resolve_tickers_async(qdrant_client, collection_name, query)
+    cache = collection_cache(qdrant_client, collection_name)
+    if cache.sparse is None:
+        cache.sparse = await has_sparse_vectors_async(qdrant_client, collection_name)
+    dense, sparse = await asyncio.to_thread(encode_query, query, cache.sparse)
+
+    async def search(query_filter: Optional[Filter]) -> List[ScoredPoint]:
+        response = await qdrant_client.query_points(
+            collection_name=collection_name,
+            **build_query(dense, sparse, query_filter, limit, prefetch_limit),
+        )
+        return response.points
+
+    points = await search(build_filter(tickers, keywords))
+    if tickers and len(points) < limit:
+        points = await search(build_filter([], keywords))
+
+    return points
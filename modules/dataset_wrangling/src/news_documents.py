@@ -2,7 +2,9 @@
 This module contains classes for the ETL pipeline of the news articles.
 """
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+import re
+from collections import Counter
 from hashlib import md5
 from unstructured.partition.html import partition_html
 from unstructured.cleaners.core import (
@@ -11,15 +13,25 @@ from unstructured.cleaners.core import (
     clean,
 )
 from unstructured.staging.huggingface import chunk_by_attention_window
+import torch
 from transformers import AutoTokenizer, AutoModel
 from loguru import logger
 
 from src.utils import Document
 
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME)
+# Size of the dense vectors of EMBEDDING_MODEL_NAME, the collections are created with it:
+# change both together, and import the re-embedded collection with scripts/migrate_collection.py
 QDRANT_VECTOR_SIZE = 384
 
+# BM25 term frequency saturation and length normalization. IDF is applied by Qdrant.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# BM25 terms are whole lower-cased words, so tickers like AAPL or C3.ai stay one term
+BM25_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[.'&-][a-z0-9]+)*")
+
 
 def parse_article(article: Dict) -> Document:
     """
@@ -47,6 +59,7 @@ def parse_article(article: Dict) -> Document:
             "date": article["date"],
             "headline": headline,
             "summary": summary,
+            "symbols": article.get("symbols", []),
         },
     )
 
@@ -77,26 +90,211 @@ def chunk_document(document: Document) -> Document:
     return document
 
 
-def embed_document(document: Document) -> Document:
+def embed_document(document: Document, batch_size: int = 1) -> Document:
     """
     Embed the document chunks using a pre-trained transformer model
 
     Args:
         document (Document): A document object containing the chunks of the article
+        batch_size (int): The number of chunks per forward pass
 
     Returns:
         Document: A document object containing the embeddings of the chunks
     """
-    for chunk in document.chunks:
-        tokens = tokenizer(
-            chunk,
-            return_tensors="pt",
-            padding=True,
-            truncation=True,
-            max_length=QDRANT_VECTOR_SIZE,
-        )
-        embedding = model(**tokens).last_hidden_state[:, 0, :].detach().cpu().numpy()
-        embedding_list = embedding.flatten().tolist()
-        document.embeddings.append(embedding_list)
+    document.embeddings.extend(embed_texts(document.chunks, batch_size))
+
+    return document
+
+
+def load_embedder(model_name: str) -> Tuple[AutoTokenizer, AutoModel]:
+    """
+    Load the tokenizer and the model of another pre-trained transformer, to embed with it
+    instead of the default model
+
+    Args:
+        model_name (str): The name of the model on the Hugging Face hub
+
+    Returns:
+        Tuple[AutoTokenizer, AutoModel]: The tokenizer and the model
+    """
+    embed_tokenizer = AutoTokenizer.from_pretrained(model_name)
+    embed_model = AutoModel.from_pretrained(model_name)
+    return embed_tokenizer, embed_model
+
+
+def embed_texts(
+    texts: List[str], batch_size: int = 32, embedder: Optional[Tuple] = None
+) -> List[List[float]]:
+    """
+    Embed texts in batches using the pre-trained transformer model
+
+    Args:
+        texts (List[str]): The texts to embed
+        batch_size (int): The number of texts per forward pass
+        embedder (Optional[Tuple]): A (tokenizer, model) pair from `load_embedder`, None for the default model
+
+    Returns:
+        List[List[float]]: The embedding of every text
+    """
+    embed_tokenizer, embed_model = embedder or (tokenizer, model)
+
+    embeddings = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            tokens = embed_tokenizer(
+                texts[start : start + batch_size],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=QDRANT_VECTOR_SIZE,
+            )
+            embedding = embed_model(**tokens).last_hidden_state[:, 0, :].cpu().numpy()
+            embeddings.extend(embedding.tolist())
+
+    return embeddings
+
+
+def embed_documents(documents: List[Document], batch_size: int = 32) -> List[Document]:
+    """
+    Embed the chunks of several documents together, batching chunks across documents
+
+    Args:
+        documents (List[Document]): Document objects containing the chunks of the articles
+        batch_size (int): The number of chunks per forward pass
+
+    Returns:
+        List[Document]: The document objects containing the embeddings of their chunks
+    """
+    chunks = [chunk for document in documents for chunk in document.chunks]
+    embeddings = iter(embed_texts(chunks, batch_size))
+
+    for document in documents:
+        document.embeddings = [next(embeddings) for _ in document.chunks]
+
+    return documents
+
+
+def bm25_terms(text: str) -> List[str]:
+    """
+    Split a text into the words indexed by BM25
+
+    Args:
+        text (str): The text
+
+    Returns:
+        List[str]: The lower-cased words of the text
+    """
+    return BM25_WORD_PATTERN.findall(text.lower())
+
+
+def bm25_term_id(term: str) -> int:
+    """
+    Map a word to its sparse vector index, a 32-bit hash of the word
 
+    Args:
+        term (str): A word returned by `bm25_terms`
+
+    Returns:
+        int: The index of the word in the sparse vectors
+    """
+    return int.from_bytes(md5(term.encode()).digest()[:4], "little")
+
+
+def sparse_embed_texts(
+    texts: List[str], query: bool = False, avg_length: Optional[float] = None
+) -> List[Dict[str, List]]:
+    """
+    Build BM25 term weight vectors over the words of the texts
+
+    Args:
+        texts (List[str]): The texts to encode
+        query (bool): Weight every query term 1.0 instead of by its saturated frequency
+        avg_length (Optional[float]): The average number of words of the indexed chunks, None
+            to take the average over `texts`
+
+    Returns:
+        List[Dict[str, List]]: The sparse vector of every text, as `indices` and `values`
+    """
+    terms = [bm25_terms(text) for text in texts]
+    if avg_length is None:
+        avg_length = sum(len(words) for words in terms) / max(1, len(terms))
+    avg_length = max(1.0, avg_length)
+
+    sparse_embeddings = []
+    for words in terms:
+        counts = Counter(bm25_term_id(word) for word in words)
+
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(words) / avg_length)
+        indices = sorted(counts)
+        if query:
+            values = [1.0] * len(indices)
+        else:
+            values = [counts[i] * (BM25_K1 + 1) / (counts[i] + norm) for i in indices]
+
+        sparse_embeddings.append({"indices": indices, "values": values})
+
+    return sparse_embeddings
+
+
+def average_chunk_length(articles: List[Dict], sample_size: int = 200) -> float:
+    """
+    Estimate the average number of words of the chunks of the articles, the average document
+    length of BM25, from an evenly spaced sample of them
+
+    Args:
+        articles (List[Dict]): The news articles
+        sample_size (int): The number of articles to parse and chunk
+
+    Returns:
+        float: The average number of words per chunk
+    """
+    sample = articles[:: max(1, len(articles) // sample_size)][:sample_size]
+    lengths = [
+        len(bm25_terms(chunk))
+        for article in sample
+        for chunk in chunk_document(parse_article(article)).chunks
+    ]
+    return sum(lengths) / max(1, len(lengths))
+
+
+def sparse_embed_document(
+    document: Document, avg_length: Optional[float] = None
+) -> Document:
+    """
+    Build the BM25 sparse vectors of the document chunks for keyword search
+
+    Args:
+        document (Document): A document object containing the chunks of the article
+        avg_length (Optional[float]): The average number of words of the indexed chunks, None
+            to take the average over the document's chunks
+
+    Returns:
+        Document: A document object containing the sparse vectors of the chunks
+    """
+    document.sparse_embeddings = sparse_embed_texts(
+        document.chunks, avg_length=avg_length
+    )
     return document
+
+
+def sparse_embed_documents(
+    documents: List[Document], avg_length: Optional[float] = None
+) -> List[Document]:
+    """
+    Build the BM25 sparse vectors of the chunks of several documents together
+
+    Args:
+        documents (List[Document]): Document objects containing the chunks of the articles
+        avg_length (Optional[float]): The average number of words of the indexed chunks, None
+            to take the average over all the chunks of the documents
+
+    Returns:
+        List[Document]: The document objects containing the sparse vectors of their chunks
+    """
+    chunks = [chunk for document in documents for chunk in document.chunks]
+    sparse_embeddings = iter(sparse_embed_texts(chunks, avg_length=avg_length))
+
+    for document in documents:
+        document.sparse_embeddings = [next(sparse_embeddings) for _ in document.chunks]
+
+    return documents
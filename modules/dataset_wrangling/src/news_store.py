@@ -0,0 +1,217 @@
+"""
+This module contains functions to append news articles to, and read them back from, a columnar
+news store partitioned by date.
+
+The store is a hive-partitioned Parquet dataset (`day=YYYY-MM-DD/part-*.parquet`) under
+`NEWS_STORE_PATH`. Every row carries the Alpaca article `id` and a `content_hash` column, the
+hash of the article version (headline, summary, content and update date). Appending skips the
+versions already stored, and reading keeps the latest version of every article, so overlapping
+downloads are de-duplicated without re-reading the article bodies.
+"""
+
+from typing import Dict, List, Set
+import os
+import uuid
+from hashlib import md5
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from loguru import logger
+
+from src.paths import NEWS_STORE_PATH
+from src.utils import News
+
+NEWS_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("content_hash", pa.string()),
+        ("headline", pa.string()),
+        ("summary", pa.string()),
+        ("content", pa.string()),
+        ("date", pa.timestamp("us", tz="UTC")),
+        ("symbols", pa.list_(pa.string())),
+    ]
+)
+PARTITIONING = ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+
+
+def content_hash(headline: str, summary: str, content: str, date: datetime) -> str:
+    """
+    Hash a version of an article. The content alone is not enough: headline-only articles
+    all have an empty content.
+
+    Args:
+        headline (str): The article headline
+        summary (str): The article summary
+        content (str): The raw article content
+        date (datetime): The article update date, naive dates are taken as UTC
+
+    Returns:
+        str: The md5 hex digest of the article version
+    """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    identity = "\x1f".join(
+        [headline, summary, content, date.astimezone(timezone.utc).isoformat()]
+    )
+    return md5(identity.encode()).hexdigest()
+
+
+def _open_dataset(store_path: Path) -> ds.Dataset:
+    """
+    Open the news store as a memory-mapped Parquet dataset.
+
+    Args:
+        store_path (Path): The root directory of the news store
+
+    Returns:
+        ds.Dataset: The partitioned news dataset
+    """
+    return ds.dataset(
+        str(store_path),
+        schema=NEWS_SCHEMA.append(pa.field("day", pa.string())),
+        format="parquet",
+        partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def _day_filter(from_day: str, to_day: str) -> ds.Expression:
+    return (ds.field("day") >= from_day) & (ds.field("day") < to_day)
+
+
+def _existing_hashes(store_path: Path, days: List[str]) -> Set[str]:
+    """
+    Collect the content hashes already stored in the given day partitions.
+
+    Args:
+        store_path (Path): The root directory of the news store
+        days (List[str]): The day partitions to look into
+
+    Returns:
+        Set[str]: The content hashes found in those partitions
+    """
+    if not os.path.isdir(store_path):
+        return set()
+
+    table = _open_dataset(store_path).to_table(
+        columns=["content_hash"], filter=ds.field("day").isin(days)
+    )
+    return set(table.column("content_hash").to_pylist())
+
+
+def append_news(news: List[News], store_path: Path = NEWS_STORE_PATH) -> int:
+    """
+    Append news articles to the store, skipping articles that are already stored
+
+    Args:
+        news (List[News]): A list of news articles
+        store_path (Path): The root directory of the news store
+
+    Returns:
+        int: The number of newly stored articles
+    """
+    rows = {name: [] for name in NEWS_SCHEMA.names + ["day"]}
+    days = sorted({news_article.date.strftime("%Y-%m-%d") for news_article in news})
+    seen = _existing_hashes(store_path, days)
+
+    for news_article in news:
+        article_hash = content_hash(
+            news_article.headline,
+            news_article.summary,
+            news_article.content,
+            news_article.date,
+        )
+        if article_hash in seen:
+            continue
+        seen.add(article_hash)
+
+        rows["id"].append(news_article.id)
+        rows["content_hash"].append(article_hash)
+        rows["headline"].append(news_article.headline)
+        rows["summary"].append(news_article.summary)
+        rows["content"].append(news_article.content)
+        rows["date"].append(news_article.date)
+        rows["symbols"].append(news_article.symbols)
+        rows["day"].append(news_article.date.strftime("%Y-%m-%d"))
+
+    num_new = len(rows["content_hash"])
+    logger.debug(f"Skipped {len(news) - num_new} already stored news articles")
+    if num_new == 0:
+        return 0
+
+    os.makedirs(store_path, exist_ok=True)
+    table = pa.table(rows, schema=NEWS_SCHEMA.append(pa.field("day", pa.string())))
+    ds.write_dataset(
+        table,
+        str(store_path),
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    return num_new
+
+
+def load_news_range(
+    from_date: datetime, to_date: datetime, store_path: Path = NEWS_STORE_PATH
+) -> List[Dict]:
+    """
+    Load the news articles published from `from_date` (inclusive) until `to_date` (exclusive)
+    from the store, like the `start` and `end` dates of a download.
+
+    Only the day partitions inside the range are read. An article stored more than once, by
+    overlapping downloads or because it was edited in between, is returned once in its latest
+    version. Articles without an id are de-duplicated on their content hash.
+
+    Args:
+        from_date (datetime): The start date
+        to_date (datetime): The end date
+        store_path (Path): The root directory of the news store
+
+    Returns:
+        List[Dict]: The news articles with `id`, `headline`, `summary`, `content`, `date` and
+            `symbols` keys
+    """
+    if not os.path.isdir(store_path):
+        return []
+
+    table = _open_dataset(store_path).to_table(
+        columns=[
+            "id",
+            "content_hash",
+            "headline",
+            "summary",
+            "content",
+            "date",
+            "symbols",
+        ],
+        filter=_day_filter(
+            from_date.strftime("%Y-%m-%d"), to_date.strftime("%Y-%m-%d")
+        ),
+    )
+
+    # Walk from the latest version back so the first one seen of every article is kept
+    news, seen = [], set()
+    for row in reversed(table.sort_by("date").to_pylist()):
+        key = row["content_hash"] if row["id"] is None else row["id"]
+        if key in seen:
+            continue
+        seen.add(key)
+
+        news.append(
+            {
+                "id": row["id"],
+                "headline": row["headline"],
+                "summary": row["summary"],
+                "content": row["content"],
+                "date": row["date"].isoformat(),
+                "symbols": row["symbols"] or [],
+            }
+        )
+
+    return news[::-1]
@@ -0,0 +1,347 @@
+"""
+This module contains classes to ingest news from the Alpaca news websocket stream into Qdrant
+in micro-batches, with bounded queueing and end-to-end latency tracking.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+import asyncio
+import bisect
+import json
+import time
+
+import websockets
+from loguru import logger
+from qdrant_client import AsyncQdrantClient
+
+from src.news_documents import (
+    parse_article,
+    chunk_document,
+    embed_documents,
+    sparse_embed_documents,
+)
+from src.utils import Document
+from src.vector_db_api import push_documents_to_qdrant_async
+
+ALPACA_NEWS_STREAM_URL = "wss://stream.data.alpaca.markets/v1beta1/news"
+
+# Error codes of the news stream that retrying cannot fix: not authenticated, auth failed
+AUTH_ERROR_CODES = {401, 402}
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, float("inf")]
+
+
+class StreamError(Exception):
+    """
+    Raised when the news stream sends an error or an unexpected message during the handshake
+    """
+
+
+class StreamAuthError(StreamError):
+    """
+    Raised when the news stream rejects the credentials
+    """
+
+
+@dataclass
+class LatencyHistogram:
+    """
+    Dataclass for a fixed-bucket histogram of end-to-end ingest latencies
+    """
+
+    buckets: List[float] = field(default_factory=lambda: list(LATENCY_BUCKETS))
+    counts: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    total: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in.
+
+        Args:
+            q (float): The quantile, between 0 and 1
+
+        Returns:
+            float: The estimated latency in seconds
+        """
+        target = q * sum(self.counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if count and cumulative >= target:
+                return bound
+        return 0.0
+
+    def snapshot(self) -> Dict[str, int]:
+        return {f"le_{bound}": count for bound, count in zip(self.buckets, self.counts)}
+
+
+@dataclass
+class IngestStats:
+    """
+    Dataclass for the counters exposed by the stream ingest service
+    """
+
+    received: int = 0
+    ingested: int = 0
+    failed: int = 0
+    batches: int = 0
+    queue_depth: int = 0
+    backpressure_waits: int = 0
+    backpressure_seconds: float = 0.0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def snapshot(self) -> Dict:
+        return {
+            "received": self.received,
+            "ingested": self.ingested,
+            "failed": self.failed,
+            "batches": self.batches,
+            "queue_depth": self.queue_depth,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+            "latency_p50": self.latency.quantile(0.5),
+            "latency_p99": self.latency.quantile(0.99),
+            "latency_histogram": self.latency.snapshot(),
+        }
+
+
+def parse_stream_message(message: Dict) -> Dict:
+    """
+    Convert a news message of the Alpaca stream into the article format used by `parse_article`
+
+    Args:
+        message (Dict): A message of type "n" from the news stream
+
+    Returns:
+        Dict: The article with `headline`, `summary`, `content`, `date` and `symbols` keys
+    """
+    return {
+        "headline": message.get("headline", ""),
+        "summary": message.get("summary", ""),
+        "content": message.get("content", ""),
+        "date": message.get("updated_at") or message.get("created_at"),
+        "symbols": message.get("symbols", []),
+    }
+
+
+class NewsStreamIngestor:
+    """
+    Long running service subscribing to the Alpaca news stream and upserting the arriving
+    articles into Qdrant in micro-batches.
+
+    Articles are queued as they arrive. A batch is flushed once `batch_size` articles are
+    waiting or `max_batch_delay` seconds after its first article arrived, which bounds the
+    end-to-end latency. When the queue is full the receiver stops reading from the socket,
+    pushing the backpressure back to the server. Upserts go through the async client, so the
+    next batch is embedded while up to `max_concurrent_upserts` earlier ones are in flight.
+    """
+
+    def __init__(
+        self,
+        qdrant_client: AsyncQdrantClient,
+        collection_name: str,
+        key: str,
+        secret: str,
+        url: str = ALPACA_NEWS_STREAM_URL,
+        symbols: Optional[List[str]] = None,
+        batch_size: int = 32,
+        max_batch_delay: float = 0.5,
+        max_queue_size: int = 1000,
+        report_interval: float = 30.0,
+        sparse: bool = True,
+        max_concurrent_upserts: int = 4,
+    ):
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.key = key
+        self.secret = secret
+        self.url = url
+        self.symbols = symbols or ["*"]
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+        self.report_interval = report_interval
+        self.sparse = sparse
+        self.upserts = asyncio.Semaphore(max_concurrent_upserts)
+        self._upsert_tasks = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.stats = IngestStats()
+
+    async def run(self, reconnect_delay: float = 1.0) -> None:
+        """
+        Run the service until cancelled, reconnecting whenever the stream drops or rejects the
+        connection, e.g. with a "connection limit exceeded" error. Only rejected credentials
+        stop the service.
+
+        Args:
+            reconnect_delay (float): Initial delay before reconnecting, doubled on every failure
+        """
+        ingest_task = asyncio.create_task(self._ingest())
+        report_task = asyncio.create_task(self._report())
+        delay = reconnect_delay
+        try:
+            while True:
+                try:
+                    async with websockets.connect(self.url) as websocket:
+                        await self._subscribe(websocket)
+                        delay = reconnect_delay
+                        await self._receive(websocket)
+                    logger.warning("News stream closed by the server")
+                except StreamAuthError:
+                    raise
+                except (
+                    OSError,
+                    websockets.ConnectionClosed,
+                    websockets.InvalidHandshake,
+                    StreamError,
+                ) as e:
+                    logger.warning(f"News stream disconnected: {e}")
+
+                logger.info(f"Reconnecting to the news stream in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+        finally:
+            ingest_task.cancel()
+            report_task.cancel()
+            # Let the upserts already sent finish so their batches are not lost
+            if self._upsert_tasks:
+                await asyncio.gather(*self._upsert_tasks, return_exceptions=True)
+
+    async def _subscribe(self, websocket) -> None:
+        await self._expect(websocket, "success", "connected")
+        await websocket.send(
+            json.dumps({"action": "auth", "key": self.key, "secret": self.secret})
+        )
+        await self._expect(websocket, "success", "authenticated")
+        await websocket.send(json.dumps({"action": "subscribe", "news": self.symbols}))
+        await self._expect(websocket, "subscription")
+        logger.info(f"Subscribed to news for {self.symbols} on {self.url}")
+
+    async def _expect(self, websocket, message_type: str, msg: str = None) -> None:
+        for message in json.loads(await websocket.recv()):
+            if message.get("T") == "error":
+                error = f"{message.get('code')}: {message.get('msg')}"
+                if message.get("code") in AUTH_ERROR_CODES:
+                    raise StreamAuthError(error)
+                raise StreamError(error)
+            if message.get("T") == message_type and msg in (None, message.get("msg")):
+                return
+        raise StreamError(f"Expected a '{message_type}' message from the news stream")
+
+    async def _receive(self, websocket) -> None:
+        async for raw in websocket:
+            for message in json.loads(raw):
+                if message.get("T") == "error":
+                    logger.error(f"News stream error: {message}")
+                    continue
+                if message.get("T") != "n":
+                    continue
+
+                self.stats.received += 1
+                item = (time.monotonic(), parse_stream_message(message))
+                if self.queue.full():
+                    self.stats.backpressure_waits += 1
+                    blocked_at = time.monotonic()
+                    await self.queue.put(item)
+                    self.stats.backpressure_seconds += time.monotonic() - blocked_at
+                else:
+                    self.queue.put_nowait(item)
+                self.stats.queue_depth = self.queue.qsize()
+
+    async def _next_batch(self) -> List[Tuple[float, Dict]]:
+        batch = [await self.queue.get()]
+        # Take what is already queued first: under a backlog the head article is already past
+        # its deadline, and waiting on it alone would flush batches of one
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+        deadline = batch[0][0] + self.max_batch_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self.stats.queue_depth = self.queue.qsize()
+        return batch
+
+    async def _ingest(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            documents, arrivals, failed = await loop.run_in_executor(
+                None, self._process, batch
+            )
+            # The stats are only updated from the event loop
+            self.stats.failed += failed
+            if not documents:
+                continue
+
+            await self.upserts.acquire()
+            task = asyncio.create_task(self._upsert(documents, arrivals))
+            self._upsert_tasks.add(task)
+            task.add_done_callback(self._upsert_tasks.discard)
+
+    async def _upsert(self, documents: List[Document], arrivals: List[float]) -> None:
+        try:
+            await push_documents_to_qdrant_async(
+                documents, self.qdrant_client, self.collection_name
+            )
+        except Exception as e:
+            logger.error(f"Failed to upsert a batch of {len(documents)} articles: {e}")
+            self.stats.failed += len(documents)
+            return
+        finally:
+            self.upserts.release()
+
+        done_at = time.monotonic()
+        for arrived_at in arrivals:
+            self.stats.latency.observe(done_at - arrived_at)
+        self.stats.ingested += len(documents)
+        self.stats.batches += 1
+
+    def _process(
+        self, batch: List[Tuple[float, Dict]]
+    ) -> Tuple[List[Document], List[float], int]:
+        """
+        Parse, chunk and embed a batch of articles. Runs in an executor thread, so it reports
+        the failures instead of updating the stats itself.
+
+        Args:
+            batch (List[Tuple[float, Dict]]): The articles with their arrival times
+
+        Returns:
+            Tuple[List[Document], List[float], int]: The embedded documents, the arrival times
+                of their articles, and the number of articles that failed
+        """
+        documents, arrivals, failed = [], [], 0
+        for arrived_at, article in batch:
+            try:
+                document = chunk_document(parse_article(article))
+            except Exception as e:
+                logger.warning(f"Skipping article '{article['headline']}': {e}")
+                failed += 1
+                continue
+            documents.append(document)
+            arrivals.append(arrived_at)
+
+        try:
+            if self.sparse:
+                # The BM25 average chunk length is taken over the whole batch
+                documents = sparse_embed_documents(documents)
+            return embed_documents(documents), arrivals, failed
+        except Exception as e:
+            logger.error(f"Failed to embed a batch of {len(documents)} articles: {e}")
+            return [], [], failed + len(documents)
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(f"Stream ingest stats: {self.stats.snapshot()}")
@@ -9,3 +9,6 @@ ROOT_PATH = Path(os.path.dirname(__file__)).parent.resolve()
 
 DATA_PATH = ROOT_PATH / "data"
 RAW_NEWS_PATH = DATA_PATH / "raw_news"
+NEWS_STORE_PATH = DATA_PATH / "news_store"
+SPILL_PATH = DATA_PATH / "spill"
+EXPORTS_PATH = DATA_PATH / "exports"
@@ -0,0 +1,231 @@
+"""
+This module contains classes to keep the ingest under a memory ceiling: a governor adapting the
+embedding batch size and the number of in-flight documents to the memory in use, and a disk
+queue to spill pending articles to. It also picks the default ceiling from the memory usable by
+the run.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import os
+import json
+import time
+from pathlib import Path
+
+import psutil
+from loguru import logger
+
+# Memory limit and usage of the cgroup this process runs in, for cgroup v2 and v1
+CGROUP_MEMORY_FILES = [
+    ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+    (
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+        "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+    ),
+]
+
+
+def memory_in_use() -> int:
+    """
+    Measure the memory used by this process and all of its children, as the proportional set
+    size (PSS) where available so that memory shared copy-on-write is not counted twice.
+
+    Returns:
+        int: The memory in use in bytes
+    """
+    process = psutil.Process()
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            try:
+                total += proc.memory_full_info().pss
+            except (AttributeError, psutil.AccessDenied):
+                total += proc.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return total
+
+
+def cgroup_memory() -> Optional[Tuple[int, int]]:
+    """
+    Read the memory limit and usage of the cgroup this process runs in.
+
+    Returns:
+        Optional[Tuple[int, int]]: The limit and the usage in bytes, None when no limit is set
+    """
+    for limit_file, usage_file in CGROUP_MEMORY_FILES:
+        try:
+            with open(limit_file, "r", encoding="utf-8") as f:
+                limit = f.read().strip()
+            with open(usage_file, "r", encoding="utf-8") as f:
+                usage = int(f.read())
+        except (OSError, ValueError):
+            continue
+        # cgroup v2 writes "max" and v1 a huge number when there is no limit
+        if limit == "max" or int(limit) >= psutil.virtual_memory().total:
+            return None
+        return int(limit), usage
+    return None
+
+
+def default_memory_limit(fraction: float = 0.8) -> int:
+    """
+    Pick a memory ceiling for the run: a fraction of the memory this process tree can use, i.e.
+    what it already holds plus what is still available. On a shared host the memory held by
+    other tenants is not available, and inside a cgroup only what is left under its limit is.
+
+    Args:
+        fraction (float): The fraction of the usable memory to allow
+
+    Returns:
+        int: The memory ceiling in bytes
+    """
+    available = psutil.virtual_memory().available
+    cgroup = cgroup_memory()
+    if cgroup is not None:
+        limit, usage = cgroup
+        available = min(available, max(0, limit - usage))
+
+    return int(fraction * (available + memory_in_use()))
+
+
+class ResourceGovernor:
+    """
+    Watches the memory of this process and its workers and adapts the embedding batch size and
+    the number of in-flight documents to stay under `memory_limit` bytes.
+
+    Both knobs are halved when the memory goes over the high watermark and grown back one step
+    at a time while it stays under the low watermark. The memory is measured as the proportional
+    set size (PSS) where available, so model weights shared copy-on-write by forked workers are
+    not counted once per worker.
+    """
+
+    def __init__(
+        self,
+        memory_limit: int,
+        max_in_flight: int,
+        max_batch_size: int = 64,
+        min_batch_size: int = 1,
+        high_watermark: float = 0.85,
+        low_watermark: float = 0.6,
+        sample_interval: float = 1.0,
+    ):
+        self.memory_limit = memory_limit
+        self.max_in_flight = max_in_flight
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min_batch_size
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.sample_interval = sample_interval
+
+        self.in_flight = max_in_flight
+        self.batch_size = max_batch_size
+        self.memory = 0
+        self._sampled_at = 0.0
+
+    @property
+    def over_limit(self) -> bool:
+        return self.memory >= self.memory_limit
+
+    def memory_in_use(self) -> int:
+        return memory_in_use()
+
+    def update(self) -> bool:
+        """
+        Sample the memory, at most once per `sample_interval`, and adapt the batch size and the
+        in-flight limit.
+
+        Returns:
+            bool: True if this call took a fresh sample that crossed the memory limit
+        """
+        now = time.monotonic()
+        if now - self._sampled_at < self.sample_interval:
+            return False
+        self._sampled_at = now
+        was_over_limit = self.over_limit
+        self.memory = self.memory_in_use()
+        crossed = self.over_limit and not was_over_limit
+
+        if self.memory > self.high_watermark * self.memory_limit:
+            batch_size = max(self.min_batch_size, self.batch_size // 2)
+            in_flight = max(1, self.in_flight // 2)
+        elif self.memory < self.low_watermark * self.memory_limit:
+            batch_size = min(self.max_batch_size, self.batch_size + 1)
+            in_flight = min(self.max_in_flight, self.in_flight + 1)
+        else:
+            return crossed
+
+        self._resize(batch_size, in_flight)
+        return crossed
+
+    def back_off(self) -> None:
+        """
+        Halve the batch size and the in-flight limit right away, e.g. after a worker was killed
+        for using too much memory.
+        """
+        self._resize(
+            max(self.min_batch_size, self.batch_size // 2), max(1, self.in_flight // 2)
+        )
+
+    def _resize(self, batch_size: int, in_flight: int) -> None:
+        if (batch_size, in_flight) != (self.batch_size, self.in_flight):
+            logger.debug(
+                f"Memory {self.memory / 1024**2:.0f}/{self.memory_limit / 1024**2:.0f} MB: "
+                f"batch size {self.batch_size} -> {batch_size}, "
+                f"in-flight {self.in_flight} -> {in_flight}"
+            )
+        self.batch_size, self.in_flight = batch_size, in_flight
+
+
+class SpillQueue:
+    """
+    FIFO queue of articles kept in a JSON lines file on disk
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._length = 0
+        self._offset = 0
+        os.makedirs(path.parent, exist_ok=True)
+        open(self.path, "w", encoding="utf-8").close()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def extend(self, articles: List[Dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for article in articles:
+                f.write(json.dumps(article, ensure_ascii=False) + "\n")
+        self._length += len(articles)
+
+    def pop(self, count: int) -> List[Dict]:
+        """
+        Read back the oldest spilled articles.
+
+        Args:
+            count (int): The maximum number of articles to read
+
+        Returns:
+            List[Dict]: The articles, oldest first
+        """
+        articles = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self._offset)
+            while len(articles) < count:
+                line = f.readline()
+                if not line:
+                    break
+                articles.append(json.loads(line))
+            self._offset = f.tell()
+        self._length -= len(articles)
+
+        # Reset the file once it is drained so it does not grow forever
+        if self._length == 0:
+            open(self.path, "w", encoding="utf-8").close()
+            self._offset = 0
+
+        return articles
+
+    def close(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,5 +1,5 @@
 from typing import Dict, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -14,6 +14,7 @@ class Document(BaseModel):
     metadata: Optional[Dict] = []
     chunks: Optional[List[str]] = []
     embeddings: Optional[List[List[float]]] = []
+    sparse_embeddings: Optional[List[Dict[str, List]]] = []
 
 
 @dataclass
@@ -26,3 +27,5 @@ class News:
     summary: str
     content: str
     date: datetime
+    symbols: List[str] = field(default_factory=list)
+    id: Optional[int] = None
@@ -1,8 +1,12 @@
 """
 This module contains functions to connect to the qdrant db and initialize a collection.
+
+Clients use REST by default. Set `QDRANT_PREFER_GRPC=true` to send requests over gRPC, which
+encodes vectors in binary instead of JSON. The async client lets many upserts be in flight from
+a single process.
 """
 
-from typing import Tuple, List
+from typing import Optional, Tuple, List
 
 import os
 import sys
@@ -13,10 +17,18 @@ from loguru import logger
 from hashlib import md5
 
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.api_client import UnexpectedResponse
-from qdrant_client.http.models import Distance, VectorParams
-from qdrant_client.models import PointStruct
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    Modifier,
+    PayloadSchemaType,
+    SparseVectorParams,
+    TextIndexParams,
+    TextIndexType,
+    TokenizerType,
+    VectorParams,
+)
+from qdrant_client.models import PointStruct, SparseVector
 
 from src.utils import Document
 
@@ -25,15 +37,50 @@ load_dotenv()
 try:
     QDRANT_API_URL = os.getenv("QDRANT_API_URL")
     QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+    QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 except KeyError as e:
     logger.error(f"Error: {e}")
     sys.exit(1)
 
+SPARSE_VECTOR_NAME = "text-sparse"
+
+
+def get_qdrant_client(prefer_grpc: Optional[bool] = None) -> QdrantClient:
+    """
+    Build a synchronous qdrant client
+
+    Args:
+        prefer_grpc (Optional[bool]): Use gRPC instead of REST, None to follow `QDRANT_PREFER_GRPC`
 
-def get_qdrant_client() -> QdrantClient:
+    Returns:
+        QdrantClient: The qdrant client
+    """
     qdrant_client = QdrantClient(
         url=QDRANT_API_URL,
         api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc,
+        grpc_port=QDRANT_GRPC_PORT,
+    )
+
+    return qdrant_client
+
+
+def get_async_qdrant_client(prefer_grpc: Optional[bool] = None) -> AsyncQdrantClient:
+    """
+    Build an asyncio qdrant client
+
+    Args:
+        prefer_grpc (Optional[bool]): Use gRPC instead of REST, None to follow `QDRANT_PREFER_GRPC`
+
+    Returns:
+        AsyncQdrantClient: The async qdrant client
+    """
+    qdrant_client = AsyncQdrantClient(
+        url=QDRANT_API_URL,
+        api_key=QDRANT_API_KEY,
+        prefer_grpc=QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc,
+        grpc_port=QDRANT_GRPC_PORT,
     )
 
     return qdrant_client
@@ -45,22 +92,85 @@ def init_collection(
     vector_size: int,
 ) -> QdrantClient:
 
-    try:
-        qdrant_client.get_collection(collection_name=collection_name)
+    # `collection_exists` behaves the same over REST and gRPC
+    if qdrant_client.collection_exists(collection_name=collection_name):
         logger.debug(f"Retrieved an existing Qdrant Collection: {collection_name}")
-    except (UnexpectedResponse, ValueError):
-        qdrant_client.recreate_collection(
+    else:
+        qdrant_client.create_collection(
             collection_name=collection_name,
             vectors_config=VectorParams(
                 size=vector_size,
                 distance=Distance.COSINE,
             ),
+            sparse_vectors_config={
+                SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF),
+            },
         )
+        create_keyword_indexes(qdrant_client, collection_name)
         logger.debug(f"Re-created Qdrant Collection: {collection_name}")
 
     return qdrant_client
 
 
+def create_keyword_indexes(qdrant_client: QdrantClient, collection_name: str) -> None:
+    """
+    Index the payload fields used to prefilter searches: full-text indexes on the chunk text
+    and the headline, and a keyword index on the ticker symbols
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+    """
+    for field_name in ["text", "headline"]:
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=TextIndexParams(
+                type=TextIndexType.TEXT,
+                tokenizer=TokenizerType.WORD,
+                lowercase=True,
+            ),
+        )
+    qdrant_client.create_payload_index(
+        collection_name=collection_name,
+        field_name="symbols",
+        field_schema=PayloadSchemaType.KEYWORD,
+    )
+
+
+def has_sparse_vectors(qdrant_client: QdrantClient, collection_name: str) -> bool:
+    """
+    Check whether the collection stores the BM25 sparse vectors. Collections created before
+    they were added only hold the dense vectors and need to be migrated to get them.
+
+    Args:
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+
+    Returns:
+        bool: True if the collection has the sparse vectors
+    """
+    params = qdrant_client.get_collection(collection_name=collection_name).config.params
+    return SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+
+
+async def has_sparse_vectors_async(
+    qdrant_client: AsyncQdrantClient, collection_name: str
+) -> bool:
+    """
+    Async version of `has_sparse_vectors`
+
+    Args:
+        qdrant_client (AsyncQdrantClient): The async qdrant client
+        collection_name (str): The name of the collection
+
+    Returns:
+        bool: True if the collection has the sparse vectors
+    """
+    collection = await qdrant_client.get_collection(collection_name=collection_name)
+    return SPARSE_VECTOR_NAME in (collection.config.params.sparse_vectors or {})
+
+
 def build_payloads(doc: Document) -> Tuple[List, List]:
     """
     Build the ids and payloads for each document
@@ -81,21 +191,76 @@ def build_payloads(doc: Document) -> Tuple[List, List]:
     return ids, payloads
 
 
+def build_points(doc: Document) -> List[PointStruct]:
+    """
+    Build the points of the document chunks, with their sparse vectors when the document has them
+
+    Args:
+        doc (Document): An embedded document
+
+    Returns:
+        List[PointStruct]: One point per chunk
+    """
+    ids, payloads = build_payloads(doc)
+
+    vectors = doc.embeddings
+    if doc.sparse_embeddings:
+        vectors = [
+            {"": dense, SPARSE_VECTOR_NAME: SparseVector(**sparse)}
+            for dense, sparse in zip(doc.embeddings, doc.sparse_embeddings)
+        ]
+
+    return [
+        PointStruct(
+            id=idx,
+            vector=vector,
+            payload=payload,
+        )
+        for idx, vector, payload in zip(ids, vectors, payloads)
+    ]
+
+
 def push_document_to_qdrant(
     doc: Document, qdrant_client: QdrantClient, collection_name: str
 ) -> None:
     """ """
 
-    ids, payloads = build_payloads(doc)
-
     qdrant_client.upsert(
         collection_name=collection_name,
-        points=[
-            PointStruct(
-                id=idx,
-                vector=vector,
-                payload=payload,
-            )
-            for idx, vector, payload in zip(ids, doc.embeddings, payloads)
-        ],
+        points=build_points(doc),
     )
+
+
+def push_documents_to_qdrant(
+    docs: List[Document], qdrant_client: QdrantClient, collection_name: str
+) -> None:
+    """
+    Push the chunks of several documents into a qdrant collection with a single upsert
+
+    Args:
+        docs (List[Document]): Embedded documents
+        qdrant_client (QdrantClient): The qdrant client
+        collection_name (str): The name of the collection
+    """
+    points = [point for doc in docs for point in build_points(doc)]
+
+    if points:
+        qdrant_client.upsert(collection_name=collection_name, points=points)
+
+
+async def push_documents_to_qdrant_async(
+    docs: List[Document], qdrant_client: AsyncQdrantClient, collection_name: str
+) -> None:
+    """
+    Push the chunks of several documents into a qdrant collection with a single upsert,
+    without blocking the event loop
+
+    Args:
+        docs (List[Document]): Embedded documents
+        qdrant_client (AsyncQdrantClient): The async qdrant client
+        collection_name (str): The name of the collection
+    """
+    points = [point for doc in docs for point in build_points(doc)]
+
+    if points:
+        await qdrant_client.upsert(collection_name=collection_name, points=points)
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, SparseVector
+
+from src.collection_io import (
+    export_collection,
+    import_collection,
+    load_manifest,
+    reembed_export,
+)
+from src.news_documents import (
+    EMBEDDING_MODEL_NAME,
+    QDRANT_VECTOR_SIZE,
+    embed_texts,
+    model,
+    sparse_embed_texts,
+    tokenizer,
+)
+from src.vector_db_api import SPARSE_VECTOR_NAME, init_collection
+
+CHUNKS = [
+    ("Apple iPhone sales beat analyst estimates", ["AAPL"]),
+    ("Nvidia reports surging demand for its AI chips", ["NVDA"]),
+    ("Microsoft invests billions in AI startups", ["MSFT"]),
+]
+
+
+@pytest.fixture
+def qdrant_client():
+    qdrant_client = init_collection(
+        QdrantClient(":memory:"), "source", QDRANT_VECTOR_SIZE
+    )
+    texts = [text for text, _ in CHUNKS]
+    qdrant_client.upsert(
+        collection_name="source",
+        points=[
+            PointStruct(
+                id=i,
+                vector={"": dense, SPARSE_VECTOR_NAME: SparseVector(**sparse)},
+                payload={"text": text, "symbols": symbols},
+            )
+            for i, (dense, sparse, (text, symbols)) in enumerate(
+                zip(embed_texts(texts), sparse_embed_texts(texts), CHUNKS)
+            )
+        ],
+    )
+    yield qdrant_client
+    qdrant_client.close()
+
+
+def stored_points(qdrant_client, collection_name):
+    points, _ = qdrant_client.scroll(
+        collection_name=collection_name, with_payload=True, with_vectors=True
+    )
+    return {
+        point.id: (
+            point.payload,
+            point.vector[SPARSE_VECTOR_NAME],
+            np.array(point.vector[""]),
+        )
+        for point in points
+    }
+
+
+def assert_same_points(actual, expected):
+    assert actual.keys() == expected.keys()
+    for id, (payload, sparse, dense) in expected.items():
+        assert actual[id][:2] == (payload, sparse)
+        assert np.allclose(actual[id][2], dense, atol=1e-5)
+
+
+def test_export_import_round_trip(qdrant_client, tmp_path):
+    assert export_collection(qdrant_client, "source", tmp_path, page_size=2) == 3
+    assert load_manifest(tmp_path) == {
+        "count": 3,
+        "vector_size": QDRANT_VECTOR_SIZE,
+        "model": EMBEDDING_MODEL_NAME,
+    }
+
+    assert import_collection(qdrant_client, "copy", tmp_path, parallel=1) == 3
+    assert_same_points(
+        stored_points(qdrant_client, "copy"), stored_points(qdrant_client, "source")
+    )
+
+
+def test_reembedded_export_needs_its_model(qdrant_client, tmp_path, monkeypatch):
+    export_collection(qdrant_client, "source", tmp_path / "export")
+    # The default model stands in for another one, so the vectors come out the same
+    monkeypatch.setattr(
+        "src.collection_io.load_embedder", lambda model_name: (tokenizer, model)
+    )
+    assert reembed_export(tmp_path / "export", tmp_path / "other", "other-model") == 3
+    assert load_manifest(tmp_path / "other")["model"] == "other-model"
+
+    with pytest.raises(ValueError):
+        import_collection(qdrant_client, "other", tmp_path / "other", parallel=1)
+    assert not qdrant_client.collection_exists("other")
+
+    import_collection(
+        qdrant_client, "other", tmp_path / "other", parallel=1, model="other-model"
+    )
+    assert_same_points(
+        stored_points(qdrant_client, "other"), stored_points(qdrant_client, "source")
+    )
+
+
+def test_import_refuses_another_vector_size(qdrant_client, tmp_path):
+    export_collection(qdrant_client, "source", tmp_path)
+    init_collection(qdrant_client, "small", 8)
+
+    with pytest.raises(ValueError):
+        import_collection(qdrant_client, "small", tmp_path, parallel=1)
@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+from src.context_compression import ContextCompressor
+
+
+@pytest.fixture
+def score_sentences(monkeypatch):
+    """
+    Make the embedder give every sentence the cosine similarity to the query listed in `scores`
+    """
+
+    def set_scores(scores):
+        def embed_texts(texts):
+            return [[1.0, 0.0]] + [[score, math.sqrt(1 - score**2)] for score in scores]
+
+        monkeypatch.setattr("src.context_compression.embed_texts", embed_texts)
+
+    return set_scores
+
+
+def select(lengths, token_budget=10):
+    compressor = ContextCompressor(token_budget)
+    sentences = [f"Sentence {i}." for i in range(len(lengths))]
+    return compressor._select("query", sentences, lengths)
+
+
+def test_select_packs_best_sentences_in_original_order(score_sentences):
+    score_sentences([0.5, 0.1, 0.9])
+
+    assert select([5, 5, 5]) == [0, 2]
+
+
+def test_select_skips_sentences_over_the_remaining_budget(score_sentences):
+    score_sentences([0.9, 0.5, 0.1, 0.3])
+
+    assert select([20, 6, 4, 1]) == [1, 3]
+
+
+def test_select_keeps_best_sentence_when_all_are_over_budget(score_sentences):
+    score_sentences([0.2, 0.8, 0.5])
+
+    assert select([20, 30, 40]) == [1]
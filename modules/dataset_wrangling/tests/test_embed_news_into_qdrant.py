@@ -0,0 +1,94 @@
+import os
+import signal
+import time
+from collections import deque
+from pathlib import Path
+
+from tqdm import tqdm
+
+from scripts.embed_news_into_qdrant import run_pipeline
+from src.execution_plan import ExecutionPlan
+from src.resource_governor import ResourceGovernor, SpillQueue
+
+
+def process(article, batch_size, sparse_avg_length, collection_name):
+    """
+    Stand-in for `process_and_push_document`, run in the pool workers: the "poison" article
+    kills its worker like the OOM killer would, the "flaky" one fails on its first attempt
+    """
+    out = Path(article["out"])
+    if article["headline"] == "poison":
+        time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGKILL)
+    if article["headline"] == "flaky" and not (out / "flaky.attempted").exists():
+        (out / "flaky.attempted").touch()
+        raise ConnectionError("Qdrant is unavailable")
+    # Keep the other articles in flight when the poison one kills its worker
+    time.sleep(0.2)
+    (out / f"{article['headline']}.done").touch()
+
+
+def test_pipeline_survives_killed_workers_and_failing_articles(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "scripts.embed_news_into_qdrant.process_and_push_document", process
+    )
+    headlines = [f"article-{i}" for i in range(6)] + ["poison", "flaky"]
+    headlines += [f"article-{i}" for i in range(6, 12)]
+    pending = deque(
+        {"id": i, "headline": headline, "date": "2024-01-02", "out": str(tmp_path)}
+        for i, headline in enumerate(headlines)
+    )
+    spill = SpillQueue(tmp_path / "spill" / "pending.jsonl")
+    plan = ExecutionPlan(num_processes=2, threads_per_process=1, share_model=True)
+    governor = ResourceGovernor(2**50, max_in_flight=4, sample_interval=0.05)
+
+    with tqdm(total=len(pending), disable=True) as progress:
+        skipped = run_pipeline(
+            pending, spill, plan, governor, progress, sparse_avg_length=None
+        )
+    spill.close()
+
+    assert skipped == 1
+    assert sorted(path.stem for path in tmp_path.glob("*.done")) == sorted(
+        headline for headline in headlines if headline != "poison"
+    )
+
+
+def test_single_process_reuses_one_client(tmp_path, monkeypatch):
+    class Client:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    clients, pushed = [], []
+
+    def open_client():
+        clients.append(Client())
+        return clients[-1]
+
+    module = "scripts.embed_news_into_qdrant"
+    monkeypatch.setattr(f"{module}.apply_plan", lambda plan: None)
+    monkeypatch.setattr(f"{module}.get_qdrant_client", open_client)
+    monkeypatch.setattr(f"{module}.parse_article", lambda article: article)
+    monkeypatch.setattr(f"{module}.chunk_document", lambda document: document)
+    monkeypatch.setattr(
+        f"{module}.embed_document", lambda document, batch_size: document
+    )
+    monkeypatch.setattr(
+        f"{module}.push_document_to_qdrant",
+        lambda document, client, name: pushed.append((document["id"], client, name)),
+    )
+    pending = deque({"id": i} for i in range(3))
+    spill = SpillQueue(tmp_path / "pending.jsonl")
+    plan = ExecutionPlan(num_processes=1, threads_per_process=1, share_model=True)
+    governor = ResourceGovernor(2**50, max_in_flight=1, sample_interval=0.05)
+
+    with tqdm(total=len(pending), disable=True) as progress:
+        run_pipeline(
+            pending, spill, plan, governor, progress, None, collection_name="news"
+        )
+    spill.close()
+
+    assert len(clients) == 1 and clients[0].closed
+    assert pushed == [(i, clients[0], "news") for i in range(3)]
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    Distance,
+    Modifier,
+    SparseVectorParams,
+    VectorParams,
+)
+from qdrant_client.models import PointStruct, SparseVector
+
+from src.hybrid_search import (
+    extract_tickers,
+    hybrid_search,
+    hybrid_search_async,
+    resolve_tickers,
+)
+from src.news_documents import QDRANT_VECTOR_SIZE, embed_texts, sparse_embed_texts
+from src.vector_db_api import SPARSE_VECTOR_NAME
+
+COLLECTION_NAME = "hybrid_search_test"
+CHUNKS = [
+    ("Apple iPhone sales beat analyst estimates", ["AAPL"]),
+    ("Nvidia reports surging demand for its AI chips", ["NVDA"]),
+    ("C3.ai expands its enterprise AI software platform", ["AI"]),
+    ("Microsoft invests billions in AI startups", ["MSFT"]),
+]
+
+
+def make_points(sparse):
+    texts = [text for text, _ in CHUNKS]
+    vectors = embed_texts(texts)
+    if sparse:
+        vectors = [
+            {"": dense, SPARSE_VECTOR_NAME: SparseVector(**sparse_vector)}
+            for dense, sparse_vector in zip(vectors, sparse_embed_texts(texts))
+        ]
+    return [
+        PointStruct(id=i, vector=vector, payload={"text": text, "symbols": symbols})
+        for i, (vector, (text, symbols)) in enumerate(zip(vectors, CHUNKS))
+    ]
+
+
+def make_collection(qdrant_client, sparse):
+    sparse_vectors_config = None
+    if sparse:
+        sparse_vectors_config = {
+            SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+        }
+    qdrant_client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=VectorParams(size=QDRANT_VECTOR_SIZE, distance=Distance.COSINE),
+        sparse_vectors_config=sparse_vectors_config,
+    )
+    qdrant_client.upsert(collection_name=COLLECTION_NAME, points=make_points(sparse))
+    return qdrant_client
+
+
+@pytest.fixture(params=[True, False], ids=["hybrid", "dense_only"])
+def qdrant_client(request):
+    qdrant_client = make_collection(QdrantClient(":memory:"), sparse=request.param)
+    yield qdrant_client
+    qdrant_client.close()
+
+
+def returned_symbols(points):
+    return {symbol for point in points for symbol in point.payload["symbols"]}
+
+
+def test_extract_tickers():
+    assert extract_tickers("Should I buy AI stocks like $nvda, AAPL or $AAPL?") == (
+        ["NVDA", "AAPL"],
+        [],
+    )
+    assert extract_tickers("Is MSFT a buy? I think IT is") == ([], ["MSFT"])
+
+
+def test_resolve_tickers_keeps_indexed_words_and_cashtags(qdrant_client):
+    assert resolve_tickers(qdrant_client, COLLECTION_NAME, "AAPL or XYZQ?") == ["AAPL"]
+    assert resolve_tickers(qdrant_client, COLLECTION_NAME, "Is $AI a buy?") == ["AI"]
+
+
+def test_collection_lookups_are_cached(qdrant_client, monkeypatch):
+    hybrid_search(qdrant_client, COLLECTION_NAME, "How is AAPL doing?", limit=1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("collection looked up again")
+
+    monkeypatch.setattr(qdrant_client, "get_collection", fail)
+    monkeypatch.setattr(qdrant_client, "count", fail)
+    points = hybrid_search(
+        qdrant_client, COLLECTION_NAME, "Apple iPhone sales of AAPL", limit=1
+    )
+
+    assert returned_symbols(points) == {"AAPL"}
+
+
+def test_search_filters_on_named_tickers(qdrant_client):
+    points = hybrid_search(
+        qdrant_client, COLLECTION_NAME, "How are NVDA and MSFT doing?", limit=2
+    )
+
+    assert returned_symbols(points) == {"NVDA", "MSFT"}
+
+
+def test_common_words_do_not_filter(qdrant_client):
+    assert (
+        resolve_tickers(qdrant_client, COLLECTION_NAME, "Should I buy AI or IT now?")
+        == []
+    )
+
+    points = hybrid_search(
+        qdrant_client,
+        COLLECTION_NAME,
+        "Which company reports surging demand for AI chips?",
+        limit=1,
+    )
+
+    assert returned_symbols(points) == {"NVDA"}
+
+
+def test_async_search_on_dense_only_collection():
+    async def run():
+        qdrant_client = AsyncQdrantClient(":memory:")
+        await qdrant_client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=VectorParams(
+                size=QDRANT_VECTOR_SIZE, distance=Distance.COSINE
+            ),
+        )
+        await qdrant_client.upsert(
+            collection_name=COLLECTION_NAME, points=make_points(sparse=False)
+        )
+        points = await hybrid_search_async(
+            qdrant_client, COLLECTION_NAME, "Apple iPhone sales", limit=1
+        )
+        await qdrant_client.close()
+        return points
+
+    points = asyncio.run(run())
+
+    assert returned_symbols(points) == {"AAPL"}
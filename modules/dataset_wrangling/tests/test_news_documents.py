@@ -0,0 +1,39 @@
+from src.news_documents import bm25_term_id, bm25_terms, sparse_embed_texts
+
+
+def test_bm25_terms_keep_tickers_whole():
+    assert bm25_terms("AAPL and C3.ai rose, NVDA's AI chips didn't") == [
+        "aapl",
+        "and",
+        "c3.ai",
+        "rose",
+        "nvda's",
+        "ai",
+        "chips",
+        "didn't",
+    ]
+
+
+def test_query_and_chunk_share_term_ids():
+    query = sparse_embed_texts(["AAPL"], query=True)[0]
+    chunk = sparse_embed_texts(["Apple (AAPL) beat estimates"])[0]
+
+    assert query == {"indices": [bm25_term_id("aapl")], "values": [1.0]}
+    assert bm25_term_id("aapl") in chunk["indices"]
+
+
+def test_longer_than_average_chunks_weigh_less():
+    short, long = sparse_embed_texts(
+        ["Tesla recalls cars", "Tesla recalls cars after a long safety investigation"],
+        avg_length=5,
+    )
+    term = bm25_term_id("tesla")
+
+    assert (
+        short["values"][short["indices"].index(term)]
+        > long["values"][long["indices"].index(term)]
+    )
+    # Without an average length, it is taken over the texts themselves
+    assert sparse_embed_texts(["one two", "three four"]) == sparse_embed_texts(
+        ["one two", "three four"], avg_length=2
+    )
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from src.news_store import append_news, load_news_range
+from src.utils import News
+
+DAY = datetime(2024, 1, 2, 15, 30, tzinfo=timezone.utc)
+
+
+def test_append_news_skips_stored_articles(tmp_path):
+    article = News("Apple beats estimates", "Summary", "<p>Body</p>", DAY, ["AAPL"], 1)
+
+    assert append_news([article], tmp_path) == 1
+    assert append_news([article], tmp_path) == 0
+    assert len(load_news_range(DAY, DAY.replace(day=3), tmp_path)) == 1
+
+
+def test_append_news_keeps_distinct_contentless_articles(tmp_path):
+    news = [
+        News("Apple beats estimates", "", "", DAY, ["AAPL"], 1),
+        News("Tesla recalls vehicles", "", "", DAY, ["TSLA"], 2),
+    ]
+
+    assert append_news(news, tmp_path) == 2
+    assert append_news(news, tmp_path) == 0
+
+    loaded = load_news_range(DAY, DAY.replace(day=3), tmp_path)
+    assert sorted(article["headline"] for article in loaded) == [
+        "Apple beats estimates",
+        "Tesla recalls vehicles",
+    ]
+
+
+def test_load_news_range_keeps_latest_version_of_edited_articles(tmp_path):
+    original = News("Apple beats estimates", "", "<p>Draft</p>", DAY, ["AAPL"], 1)
+    edited = News(
+        "Apple beats estimates", "", "<p>Final</p>", DAY.replace(day=3), ["AAPL"], 1
+    )
+
+    assert append_news([original], tmp_path) == 1
+    assert append_news([original, edited], tmp_path) == 1
+
+    loaded = load_news_range(DAY, DAY.replace(day=4), tmp_path)
+    assert [(article["id"], article["content"]) for article in loaded] == [
+        (1, "<p>Final</p>")
+    ]
+
+
+def test_load_news_range_excludes_end_date(tmp_path):
+    news = [
+        News(f"Headline {day}", "", f"Body {day}", DAY.replace(day=day), id=day)
+        for day in (1, 2, 3, 4)
+    ]
+    append_news(news, tmp_path)
+
+    loaded = load_news_range(DAY, DAY.replace(day=4), tmp_path)
+
+    assert [article["headline"] for article in loaded] == ["Headline 2", "Headline 3"]
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import time
+
+import pytest
+import websockets
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Distance, VectorParams
+
+from scripts.replay_news_stream import replay
+from src.news_documents import QDRANT_VECTOR_SIZE
+from src.news_stream import NewsStreamIngestor, StreamAuthError
+from src.utils import Document
+
+COLLECTION_NAME = "news_stream_test"
+
+
+def make_news(count):
+    return [
+        {
+            "headline": f"Company {i} reports quarterly earnings",
+            "summary": f"Company {i} beat analyst estimates.",
+            "content": f"<p>Company {i} reported revenue above expectations.</p>",
+            "date": "2024-01-02T15:30:00+00:00",
+            "symbols": ["AAPL"],
+        }
+        for i in range(count)
+    ]
+
+
+def make_ingestor(qdrant_client, url, **kwargs):
+    return NewsStreamIngestor(
+        qdrant_client,
+        COLLECTION_NAME,
+        key="key",
+        secret="secret",
+        url=url,
+        symbols=["*"],
+        sparse=False,
+        **kwargs,
+    )
+
+
+async def make_collection():
+    qdrant_client = AsyncQdrantClient(":memory:")
+    await qdrant_client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=VectorParams(size=QDRANT_VECTOR_SIZE, distance=Distance.COSINE),
+    )
+    return qdrant_client
+
+
+async def wait_for(condition, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not met in time")
+        await asyncio.sleep(0.05)
+
+
+def test_next_batch_drains_backlog():
+    async def run():
+        ingestor = make_ingestor(
+            None, "ws://unused", batch_size=32, max_batch_delay=0.5
+        )
+        # Articles that have been waiting longer than the batch delay
+        arrived_at = time.monotonic() - 10
+        for article in make_news(100):
+            ingestor.queue.put_nowait((arrived_at, article))
+
+        return [len(await ingestor._next_batch()) for _ in range(4)]
+
+    assert asyncio.run(run()) == [32, 32, 32, 4]
+
+
+def test_process_counts_embedding_failures_once(monkeypatch):
+    def fail(documents):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr("src.news_stream.embed_documents", fail)
+    ingestor = make_ingestor(None, "ws://unused")
+    batch = [(0.0, article) for article in make_news(5)]
+
+    assert ingestor._process(batch) == ([], [], 5)
+    assert ingestor.stats.failed == 0
+
+
+def test_process_drops_arrivals_of_skipped_articles(monkeypatch):
+    def parse(article):
+        if article["headline"].startswith("Company 1 "):
+            raise ValueError("malformed HTML")
+        return Document(id=article["headline"], text=[article["headline"]])
+
+    monkeypatch.setattr("src.news_stream.parse_article", parse)
+    monkeypatch.setattr("src.news_stream.embed_documents", lambda documents: documents)
+    ingestor = make_ingestor(None, "ws://unused")
+    batch = [(float(i), article) for i, article in enumerate(make_news(3))]
+
+    documents, arrivals, failed = ingestor._process(batch)
+
+    assert [document.id for document in documents] == [
+        "Company 0 reports quarterly earnings",
+        "Company 2 reports quarterly earnings",
+    ]
+    assert arrivals == [0.0, 2.0]
+    assert failed == 1
+
+
+def test_ingest_from_replay_server():
+    news = make_news(100)
+
+    async def run():
+        qdrant_client = await make_collection()
+        async with websockets.serve(
+            lambda websocket: replay(websocket, news, rate=1000.0), "localhost", 0
+        ) as server:
+            port = server.sockets[0].getsockname()[1]
+            ingestor = make_ingestor(
+                qdrant_client,
+                f"ws://localhost:{port}",
+                batch_size=32,
+                max_batch_delay=2.0,
+            )
+            task = asyncio.create_task(ingestor.run())
+            await wait_for(lambda: ingestor.stats.ingested == len(news))
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        count = (await qdrant_client.count(collection_name=COLLECTION_NAME)).count
+        await qdrant_client.close()
+        return ingestor.stats, count
+
+    stats, count = asyncio.run(run())
+
+    assert stats.received == len(news)
+    assert stats.failed == 0
+    assert stats.batches == 4
+    assert count == len(news)
+
+
+def test_run_retries_stream_errors():
+    news = make_news(3)
+    connections = []
+
+    async def handler(websocket):
+        connections.append(websocket)
+        if len(connections) == 1:
+            await websocket.send(
+                json.dumps(
+                    [{"T": "error", "code": 406, "msg": "connection limit exceeded"}]
+                )
+            )
+            return
+        await replay(websocket, news, rate=1000.0)
+
+    async def run():
+        qdrant_client = await make_collection()
+        async with websockets.serve(handler, "localhost", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            ingestor = make_ingestor(
+                qdrant_client, f"ws://localhost:{port}", max_batch_delay=0.1
+            )
+            task = asyncio.create_task(ingestor.run(reconnect_delay=0.05))
+            await wait_for(lambda: ingestor.stats.ingested == len(news))
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await qdrant_client.close()
+
+    asyncio.run(run())
+
+    assert len(connections) == 2
+
+
+def test_run_stops_on_rejected_credentials():
+    async def handler(websocket):
+        await websocket.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        await websocket.recv()
+        await websocket.send(
+            json.dumps([{"T": "error", "code": 402, "msg": "auth failed"}])
+        )
+        await websocket.wait_closed()
+
+    async def run():
+        async with websockets.serve(handler, "localhost", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            ingestor = make_ingestor(None, f"ws://localhost:{port}")
+            await asyncio.wait_for(ingestor.run(reconnect_delay=0.05), timeout=10)
+
+    with pytest.raises(StreamAuthError):
+        asyncio.run(run())
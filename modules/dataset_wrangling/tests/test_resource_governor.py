@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from src.resource_governor import ResourceGovernor, SpillQueue, default_memory_limit
+
+GB = 1024**3
+
+
+def make_governor(readings):
+    governor = ResourceGovernor(
+        1000, max_in_flight=8, max_batch_size=64, sample_interval=0
+    )
+    readings = iter(readings)
+    governor.memory_in_use = lambda: next(readings)
+    return governor
+
+
+def test_update_reports_only_the_crossing_sample():
+    governor = make_governor([500, 1200, 1300, 400, 1100])
+
+    assert [governor.update() for _ in range(5)] == [
+        False,
+        True,
+        False,
+        False,
+        True,
+    ]
+
+
+def test_update_halves_over_the_high_watermark_and_grows_back():
+    governor = make_governor([900, 900, 100])
+
+    governor.update()
+    governor.update()
+    assert (governor.batch_size, governor.in_flight) == (16, 2)
+
+    governor.update()
+    assert (governor.batch_size, governor.in_flight) == (17, 3)
+
+
+def test_back_off_halves_right_away():
+    governor = make_governor([])
+
+    governor.back_off()
+    assert (governor.batch_size, governor.in_flight) == (32, 4)
+
+
+def test_default_memory_limit_counts_only_usable_memory(monkeypatch):
+    monkeypatch.setattr(
+        "src.resource_governor.psutil.virtual_memory",
+        lambda: SimpleNamespace(total=64 * GB, available=10 * GB),
+    )
+    monkeypatch.setattr("src.resource_governor.memory_in_use", lambda: 2 * GB)
+
+    monkeypatch.setattr("src.resource_governor.cgroup_memory", lambda: None)
+    assert default_memory_limit(0.5) == 6 * GB
+
+    # Only 1 GB left under the cgroup limit
+    monkeypatch.setattr("src.resource_governor.cgroup_memory", lambda: (8 * GB, 7 * GB))
+    assert default_memory_limit(0.5) == int(1.5 * GB)
+
+
+def test_spill_queue_is_fifo(tmp_path):
+    spill = SpillQueue(tmp_path / "pending.jsonl")
+    spill.extend([{"i": i} for i in range(5)])
+
+    assert spill.pop(2) == [{"i": 0}, {"i": 1}]
+    spill.extend([{"i": 5}])
+    assert spill.pop(10) == [{"i": i} for i in range(2, 6)]
+    assert len(spill) == 0
+
+    spill.close()
+    assert not (tmp_path / "pending.jsonl").exists()